@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+""" Benchmark suite and regression gate for the filtered_logger redaction
+
+Every redaction mode is run over synthetic log corpora that vary the
+message length, the number of redacted fields and the separator. For each
+case the suite reports throughput, latency percentiles and memory use,
+can save the results as a baseline and fails when a later run is slower
+than that baseline by more than a threshold. Before measuring, it checks
+that the bulk modes redact exactly like filter_datum line by line.
+
+Usage:
+    ./bench_filtered_logger.py [--quick] [--save FILE]
+                               [--compare FILE] [--threshold RATIO]
+"""
+import argparse
+import json
+import logging
+import random
+import string
+import sys
+import tracemalloc
+from functools import partial
+from time import perf_counter, perf_counter_ns
+from typing import Callable, Dict, List, Tuple
+
+from filtered_logger import (PII_FIELDS, RedactingFormatter, filter_data,
+                             filter_datum)
+
+EXTRA_FIELDS = ("ip", "last_login", "user_agent", "city", "country",
+                "referrer", "session", "locale")
+SEPARATORS = (";", "|")
+REDACTION = "***"
+LATENCY_SAMPLES = 2000
+# Lines per buffer in the buffer cases, whose latency is per buffer
+BUFFER_LINES = 100
+
+
+def make_corpus(count: int, n_pii: int, value_length: int, separator: str,
+                seed: int = 0) -> Tuple[List[str], List[dict]]:
+    """
+    Returns `count` synthetic log lines and the dicts they render from
+
+    Arguments:
+        count (int): the number of records
+        n_pii (int): how many of the PII_FIELDS each record carries
+        value_length (int): the length of every field value
+        separator (str): the character separating fields
+        seed (int): the random seed, so corpora are reproducible
+
+    Returns:
+        tuple: the rendered `field=value<sep>` lines and the source dicts
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + "@.-_ "
+    names = PII_FIELDS[:n_pii] + EXTRA_FIELDS
+    records = []
+    for _ in range(count):
+        records.append({
+            name: "".join(rng.choice(alphabet) for _ in range(value_length))
+            for name in names
+        })
+    return _render(records, separator), records
+
+
+def _render(records: List[dict], separator: str) -> List[str]:
+    """ Renders dicts as `field=value<sep>` log lines """
+    return ["".join("{}={}{}".format(k, v, separator)
+                    for k, v in record.items()) for record in records]
+
+
+class Case:
+    """ One benchmark case: a corpus and how to redact it
+
+    `redact_one` handles a single item and is used for latency, while
+    `redact_all` handles the whole corpus, returns the outputs and is
+    used for throughput and memory.
+    `records` is the number of log records in the corpus, when an item
+    holds more than one.
+    """
+
+    def __init__(self, items: list, redact_one: Callable,
+                 redact_all: Callable = None, records: int = None):
+        self.items = items
+        self.redact_one = redact_one
+        self.redact_all = redact_all or self._redact_each
+        self.records = len(items) if records is None else records
+
+    def _redact_each(self, items: list) -> list:
+        """ Default throughput loop: one call per item """
+        redact_one = self.redact_one
+        return [redact_one(item) for item in items]
+
+
+def make_cases(quick: bool) -> Dict[str, Case]:
+    """
+    Returns the benchmark cases, keyed by a stable name
+    """
+    count = 2000 if quick else 20000
+    cases = {}
+    for separator in SEPARATORS:
+        for n_pii in (1, len(PII_FIELDS)):
+            for value_length in (8, 64):
+                lines, records = make_corpus(count, n_pii, value_length,
+                                             separator)
+                key = "sep={!r} fields={} len={}".format(
+                    separator, n_pii, value_length)
+                cases["filter_datum " + key] = Case(
+                    lines, partial(_filter_datum, separator))
+                cases["filter_data " + key] = Case(
+                    lines, partial(_filter_data, separator),
+                    partial(_filter_data, separator))
+                cases["filter_data buffer " + key] = Case(
+                    _buffers(lines, BUFFER_LINES),
+                    partial(_filter_data, separator), records=len(lines))
+                if separator == RedactingFormatter.SEPERATOR:
+                    for mode in ("string", "structured", "json_lines"):
+                        cases["{} {}".format(mode, key)] = _formatter_case(
+                            lines, records, mode)
+                    # Only PII in the dict: structured mode skips the regex
+                    pii_records = [{k: record[k] for k in PII_FIELDS[:n_pii]}
+                                   for record in records]
+                    pii_lines = _render(pii_records, separator)
+                    for mode in ("string", "structured"):
+                        cases["{} pii-only {}".format(mode, key)] = \
+                            _formatter_case(pii_lines, pii_records, mode)
+    return cases
+
+
+def _buffers(lines: List[str], size: int) -> List[str]:
+    """ Joins lines into newline separated buffers of `size` lines """
+    return ["".join(line + "\n" for line in lines[i:i + size])
+            for i in range(0, len(lines), size)]
+
+
+def _filter_datum(separator: str, line: str) -> str:
+    """ Redacts one line with filter_datum """
+    return filter_datum(PII_FIELDS, REDACTION, line, separator)
+
+
+def _filter_data(separator: str, lines) -> List[str]:
+    """ Redacts one line, or a list of lines, with filter_data """
+    if isinstance(lines, str):
+        lines = [lines]
+    return list(filter_data(PII_FIELDS, REDACTION, lines, separator))
+
+
+def check(cases: Dict[str, Case]) -> List[str]:
+    """
+    Returns a description of every corpus that filter_data, on a list or
+    on a newline separated buffer, redacts differently from filter_datum
+    applied line by line
+    """
+    corpora = [("regression", ["ip=1;password=abc", "name=bob;email=z;"],
+                ";")]
+    for name, case in cases.items():
+        if name.startswith("filter_datum "):
+            corpora.append((name, case.items, case.redact_one.args[0]))
+    failures = []
+    for name, lines, separator in corpora:
+        expected = [filter_datum(PII_FIELDS, REDACTION, line, separator)
+                    for line in lines]
+        as_list = list(filter_data(PII_FIELDS, REDACTION, lines, separator))
+        buffer = "".join(line + "\n" for line in lines)
+        as_buffer = "".join(filter_data(PII_FIELDS, REDACTION, buffer,
+                                        separator, chunk_size=1000))
+        if as_list != expected:
+            failures.append("{}: filter_data on a list".format(name))
+        if as_buffer.split("\n")[:-1] != expected:
+            failures.append("{}: filter_data on a buffer".format(name))
+    return failures
+
+
+def _formatter_case(lines: List[str], records: List[dict],
+                    mode: str) -> Case:
+    """ RedactingFormatter.format over prebuilt LogRecords """
+    formatter = RedactingFormatter(
+        list(PII_FIELDS), structured=mode != "string",
+        json_lines=mode == "json_lines")
+    if mode == "string":
+        log_records = [logging.makeLogRecord(
+            {"name": "user_data", "msg": line}) for line in lines]
+    else:
+        template = "".join("{0}=%({0})s;".format(k) for k in records[0])
+        log_records = [logging.makeLogRecord(
+            {"name": "user_data", "msg": template, "args": record})
+            for record in records]
+    return Case(log_records, formatter.format)
+
+
+def measure(case: Case, repeat: int) -> dict:
+    """
+    Runs one case and returns its metrics
+
+    Throughput is the best of `repeat` passes over the corpus, latency
+    percentiles come from timing single items, and memory is traced by
+    tracemalloc over one more pass: its peak, and the blocks allocated
+    per record that are still alive at the end of the pass. The outputs
+    are kept until then, so those blocks include the redacted records
+    themselves, while temporaries freed during the pass only show in
+    the peak.
+    """
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        case.redact_all(case.items)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    samples = []
+    redact_one = case.redact_one
+    for item in case.items[:LATENCY_SAMPLES]:
+        start = perf_counter_ns()
+        redact_one(item)
+        samples.append(perf_counter_ns() - start)
+    samples.sort()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    outputs = case.redact_all(case.items)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del outputs
+    blocks = sum(stat.count_diff for stat in
+                 after.compare_to(before, "filename"))
+
+    def percentile(p: float) -> float:
+        """ Nearest-rank percentile of the samples, in microseconds """
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(p * len(samples)))] / 1e3
+
+    return {
+        "records_per_sec": case.records / best if best else 0.0,
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+        "peak_bytes": peak,
+        "blocks_per_record": blocks / case.records,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Returns a description of every case whose throughput dropped below
+    (1 - threshold) times its baseline
+    """
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        floor = reference["records_per_sec"] * (1 - threshold)
+        if metrics["records_per_sec"] < floor:
+            regressions.append("{}: {:.0f} rec/s < {:.0f} rec/s".format(
+                name, metrics["records_per_sec"], floor))
+    return regressions
+
+
+def main() -> int:
+    """
+    Runs the suite, prints a table and applies the regression gate
+
+    Returns:
+        int: the process exit status, 1 if a regression was found
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true",
+                        help="smaller corpora and fewer repeats")
+    parser.add_argument("--save", metavar="FILE",
+                        help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="fail if slower than this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed throughput drop (default: 0.10)")
+    args = parser.parse_args()
+
+    cases = make_cases(args.quick)
+    failures = check(cases)
+    for failure in failures:
+        print("MISMATCH " + failure, file=sys.stderr)
+    if failures:
+        return 1
+
+    results = {}
+    repeat = 2 if args.quick else 5
+    print("{:<44} {:>11} {:>8} {:>8} {:>8} {:>10} {:>10}".format(
+        "case", "rec/s", "p50 us", "p95 us", "p99 us", "peak B", "blocks/rec"))
+    for name, case in cases.items():
+        metrics = measure(case, repeat)
+        results[name] = metrics
+        print("{:<44} {:>11.0f} {:>8.2f} {:>8.2f} {:>8.2f} {:>10} {:>10.2f}"
+              .format(name, metrics["records_per_sec"], metrics["p50_us"],
+                      metrics["p95_us"], metrics["p99_us"],
+                      metrics["peak_bytes"], metrics["blocks_per_record"]))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,77 @@
 #!/usr/bin/env python3
 """ Module contains a function that returns a log message obfuscated
 """
+import atexit
+import json
 import logging
+import queue
 import re
-from typing import List
+import sqlite3
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
+from os import getenv
+from time import perf_counter
+from typing import (Callable, Iterable, Iterator, List, Match, Pattern,
+                    Tuple, Union)
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+# Attributes every LogRecord has: never treated as `extra` fields
+RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {
+    "message", "asctime"}
+
+
+@lru_cache(maxsize=128)
+def redaction_pattern(fields: Tuple[str, ...], separator: str) -> Pattern:
+    """
+    Returns the compiled regex matching the value of any of the fields
+
+    One alternation covers every field, so a message is redacted in a
+    single pass; patterns are cached per (fields, separator).
+
+    Arguments:
+        fields (Tuple): the names of the fields to obfuscate
+        separator (str): the character separating fields in a log line
+
+    Returns:
+        Pattern: a regex whose first group is the matched `field=` prefix
+    """
+    return re.compile(r"((?:{})=)[^{}]*".format(
+        "|".join(re.escape(f) for f in fields), re.escape(separator)))
+
+
+@lru_cache(maxsize=128)
+def redaction_replacer(redaction: str) -> Callable[[Match], str]:
+    """
+    Returns the `re.sub` callback writing `redaction` after the field
+
+    A callback is about twice as fast as expanding a template string.
+    """
+    def replace(match: Match) -> str:
+        """ Keeps the `field=` prefix and replaces the value """
+        return match.group(1) + redaction
+    return replace
+
+
+@lru_cache(maxsize=1024)
+def _template_is_clean(pattern: Pattern, redaction: str,
+                       template: str) -> bool:
+    """
+    Returns True if a %-format template, rendered with `redaction` in
+    every placeholder, holds no field value of its own for `pattern` to
+    redact
+
+    Cached per template, so a structured record built only from redacted
+    values pays for the regex pass once per call site, not per record.
+    """
+    try:
+        rendered = template % defaultdict(lambda: redaction)
+    except (TypeError, ValueError):
+        return False
+    return pattern.sub(redaction_replacer(redaction), rendered) == rendered
 
 
 def filter_datum(fields: List[str], redaction: str, message: str,
@@ -22,10 +88,103 @@ def filter_datum(fields: List[str], redaction: str, message: str,
     Returns:
         str: the obfuscated log entry
     """
-    for f in fields:
-        message = re.sub(r"{}=([^{}]*)".format(f, separator),
-                         r"{}={}".format(f, redaction), message)
-    return message
+    if not fields:
+        return message
+    return redaction_pattern(tuple(fields), separator).sub(
+        redaction_replacer(redaction), message)
+
+
+def _redact_chunk(fields: Tuple[str, ...], redaction: str,
+                  messages: List[str], separator: str) -> List[str]:
+    """
+    Returns a chunk of log messages obfuscated
+
+    The chunk is joined with newlines and redacted in one `re.sub` call,
+    with newlines excluded from field values so no value can run into the
+    next message. Chunks where a message holds a newline of its own are
+    redacted message by message.
+    """
+    buffer = "\n".join(messages)
+    if buffer.count("\n") != len(messages) - 1:
+        return [filter_datum(fields, redaction, m, separator)
+                for m in messages]
+    return redaction_pattern(fields, separator + "\n").sub(
+        redaction_replacer(redaction), buffer).split("\n")
+
+
+def _redact_buffer(fields: Tuple[str, ...], redaction: str,
+                   buffer: List[str], separator: str) -> List[str]:
+    """
+    Returns the buffer slice held by a one-item chunk, obfuscated
+
+    Newlines are excluded from field values, so a value at the end of a
+    line never runs into the next record.
+    """
+    return [redaction_pattern(fields, separator + "\n").sub(
+        redaction_replacer(redaction), buffer[0])]
+
+
+def _split_buffer(buffer: str, chunk_size: int) -> Iterator[str]:
+    """
+    Yields slices of about `chunk_size` characters cut after a newline
+    """
+    start = 0
+    while start < len(buffer):
+        end = buffer.find("\n", start + chunk_size)
+        end = len(buffer) if end == -1 else end + 1
+        yield buffer[start:end]
+        start = end
+
+
+def filter_data(fields: List[str], redaction: str,
+                messages: Union[str, Iterable[str]], separator: str,
+                chunk_size: int = 10000,
+                processes: int = None) -> Iterator[str]:
+    """
+    Yields log messages obfuscated, processing them in chunks
+
+    Arguments:
+        fields (List): a list of strings representing all fields to obfuscate
+        redaction (str): a string representing the redaction value
+        messages (Iterable or str): the log entries to obfuscate, or one
+            buffer of newline separated log entries
+        separator (str): a character to be used as a separator between fields
+        chunk_size (int): the number of messages (or characters of the
+            buffer) redacted per `re.sub` call
+        processes (int): if set, the chunks are spread over a pool of this
+            many worker processes
+
+    Returns:
+        Iterator: the obfuscated log entries in input order, one per
+        message, or obfuscated slices of the buffer
+    """
+    fields = tuple(fields)
+    if isinstance(messages, str):
+        chunks = ([chunk] for chunk in _split_buffer(messages, chunk_size))
+        redact = _redact_buffer
+    else:
+        messages = iter(messages)
+        chunks = iter(lambda: list(islice(messages, chunk_size)), [])
+        redact = _redact_chunk
+    if not fields:
+        for chunk in chunks:
+            yield from chunk
+        return
+    if not processes:
+        for chunk in chunks:
+            yield from redact(fields, redaction, chunk, separator)
+        return
+
+    with ProcessPoolExecutor(processes) as pool:
+        # A bounded window of pending chunks keeps memory constant
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(redact, fields, redaction,
+                                       chunk, separator))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
 
 
 class RedactingFormatter(logging.Formatter):
@@ -36,9 +195,27 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPERATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], structured: bool = False,
+                 json_lines: bool = False):
+        """
+        Arguments:
+            fields (List): the fields to obfuscate
+            structured (bool): if True, records logged with a dict argument
+                or `extra` fields are redacted on those values directly;
+                the rendered message is only left unscanned when it is
+                built entirely from redacted dict values and its template
+                holds no field value of its own
+            json_lines (bool): if True, structured records are emitted as
+                one JSON object per line, with the dict and `extra` values
+                under "data"
+        """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.structured = structured
+        self.json_lines = json_lines
+        self._field_set = frozenset(fields)
+        self._pattern = redaction_pattern(tuple(fields), self.SEPERATOR)
+        self._replacer = redaction_replacer(self.REDACTION)
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -50,18 +227,242 @@ class RedactingFormatter(logging.Formatter):
         Returns:
             str: the formatted log record
         """
-        return filter_datum(self.fields, self.REDACTION,
-                            super().format(record), self.SEPERATOR)
+        if self.structured:
+            extra = record.__dict__.keys() - RECORD_ATTRIBUTES
+            if extra or isinstance(record.args, Mapping):
+                return self.format_structured(record, extra)
+        message = super().format(record)
+        if not self.fields:
+            return message
+        return self._pattern.sub(self._replacer, message)
+
+    def format_structured(self, record: logging.LogRecord,
+                          extra: Iterable[str]) -> str:
+        """
+        Formats a record whose data is carried by a dict argument and/or
+        `extra` fields, redacting the values of the fields directly
 
+        The regex pass is skipped only when every value interpolated in
+        the message is one of the fields and the template itself holds no
+        `field=value` text; positional arguments, other dict values and
+        other `extra` values can hold such text of their own and are
+        still scanned.
 
-def get_logger() -> logging.Logger:
+        Arguments:
+            record (logging.LogRecord): the log record to format
+            extra (Iterable): the names of the `extra` attributes
+
+        Returns:
+            str: the formatted log record, or a JSON line
+        """
+        fields = self._field_set
+        data = {}
+        message = record.msg if isinstance(record.msg, str) \
+            else str(record.msg)
+        if isinstance(record.args, Mapping) and record.args:
+            data = {k: self._redact_value(k, v)
+                    for k, v in record.args.items()}
+            template = message
+            message = message % data
+            if not fields.issuperset(record.args) or \
+                    not _template_is_clean(self._pattern, self.REDACTION,
+                                           template):
+                message = self._pattern.sub(self._replacer, message)
+        else:
+            if record.args:
+                message = message % record.args
+            message = self._pattern.sub(self._replacer, message)
+        for k in extra:
+            data[k] = self._redact_value(k, getattr(record, k))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        # Free text: only the regex pass can redact it
+        exc_text = record.exc_text and self._pattern.sub(self._replacer,
+                                                         record.exc_text)
+        if self.json_lines:
+            entry = {
+                "logger": record.name,
+                "level": record.levelname,
+                "time": self.formatTime(record, self.datefmt),
+                "message": message,
+                # Under a key of its own: it can't overwrite the above
+                "data": data,
+            }
+            if exc_text:
+                entry["exception"] = exc_text
+            if record.stack_info:
+                entry["stack"] = self.formatStack(record.stack_info)
+            return json.dumps(entry, default=str)
+
+        # Same steps as logging.Formatter.format, with the redacted message
+        record.message = message
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        formatted = self.formatMessage(record)
+        if exc_text:
+            formatted += "\n" + exc_text
+        if record.stack_info:
+            formatted += "\n" + self.formatStack(record.stack_info)
+        return formatted
+
+    def _redact_value(self, key: str, value):
+        """ Redacts a structured value: fields entirely, and strings of
+        other keys by the regex pass when they are emitted as JSON (in a
+        text line they only appear through the scanned message)
+        """
+        if key in self._field_set:
+            return self.REDACTION
+        if self.json_lines and isinstance(value, str):
+            return self._pattern.sub(self._replacer, value)
+        return value
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """ Queue handler that hands records to a background listener as is
+
+    Formatting and redaction are left to the listener thread, and a full
+    queue either drops the record (counted in `dropped`) or blocks the
+    caller for at most `block_timeout` seconds before dropping it.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "drop",
+                 block_timeout: float = 0.1):
+        """
+        Arguments:
+            log_queue (queue.Queue): the bounded queue read by the listener
+            overflow (str): "drop" or "block", what to do when it is full
+            block_timeout (float): the longest wait for room, in seconds
+        """
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Returns the record untouched: it never leaves the process, so
+        there is nothing to render on the calling thread
+        """
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Puts the record on the queue according to the overflow policy
+        """
+        try:
+            if self.overflow == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class FlushingQueueListener(QueueListener):
+    """ Queue listener whose stop() drains the queue even when it is full
+    """
+
+    def enqueue_sentinel(self) -> None:
+        """
+        Waits for room in the queue to post the stop sentinel
+        """
+        self.queue.put(self._sentinel)
+
+
+def get_logger(queued: bool = False, queue_size: int = 10000,
+               overflow: str = "drop") -> logging.Logger:
     """
     Returns a logger object
+
+    Arguments:
+        queued (bool): if True, records are put on a bounded queue and
+            formatted, redacted and written by a background thread
+        queue_size (int): the maximum number of pending records
+        overflow (str): "drop" to discard records when the queue is full,
+            "block" to wait briefly for room first
+
+    Returns:
+        logging.Logger: the `user_data` logger, whose handlers from an
+        earlier call are replaced, so records are never written twice
     """
     logger = logging.getLogger('user_data')
     logger.setLevel(logging.INFO)
     logger.propagate = False
-    handler = logging.streamHandler()
+    for previous in list(logger.handlers):
+        logger.removeHandler(previous)
+        listener = getattr(previous, "listener", None)
+        if listener is not None:
+            # Writes what the old queue still holds, then ends its thread
+            listener.stop()
+            atexit.unregister(listener.stop)
+    handler = logging.StreamHandler()
     handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    if queued:
+        log_queue = queue.Queue(queue_size)
+        listener = FlushingQueueListener(log_queue, handler)
+        listener.start()
+        # Pending records are written before the interpreter exits
+        atexit.register(listener.stop)
+        handler = NonBlockingQueueHandler(log_queue, overflow)
+        handler.listener = listener
     logger.addHandler(handler)
     return logger
+
+
+def get_db():
+    """
+    Returns a connection to the personal data database
+
+    Credentials come from PERSONAL_DATA_DB_USERNAME, _PASSWORD, _HOST and
+    _NAME. If PERSONAL_DATA_DB_PATH is set, that SQLite file is used
+    instead, e.g. for a local copy of the `users` table.
+    """
+    db_path = getenv("PERSONAL_DATA_DB_PATH")
+    if db_path:
+        return sqlite3.connect(db_path)
+    import mysql.connector
+    return mysql.connector.connection.MySQLConnection(
+        user=getenv("PERSONAL_DATA_DB_USERNAME", "root"),
+        password=getenv("PERSONAL_DATA_DB_PASSWORD", ""),
+        host=getenv("PERSONAL_DATA_DB_HOST", "localhost"),
+        database=getenv("PERSONAL_DATA_DB_NAME"))
+
+
+def main(batch_size: int = 1000) -> int:
+    """
+    Logs every row of the `users` table through the redacting logger
+
+    Rows are fetched `batch_size` at a time from an unbuffered cursor
+    (streamed by the server for MySQL, stepped lazily by SQLite), so
+    memory stays constant whatever the size of the table.
+
+    Returns:
+        int: the number of rows logged
+    """
+    logger = get_logger()
+    db = get_db()
+    cursor = db.cursor()
+    count = 0
+    start = perf_counter()
+    try:
+        cursor.execute("SELECT * FROM users;")
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                logger.info(" ".join("{}={};".format(k, v)
+                                     for k, v in zip(columns, row)))
+            count += len(rows)
+    finally:
+        cursor.close()
+        db.close()
+    elapsed = perf_counter() - start
+    logger.info("logged %d rows in %.2fs (%.0f rows/s)", count, elapsed,
+                count / elapsed if elapsed else 0)
+    return count
+
+
+if __name__ == "__main__":
+    main()
@@ -6,16 +6,25 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, ExcludedPaths
 from api.v1.auth.basic_auth import BasicAuth
 from api.v1.auth.session_auth import SessionAuth
 from api.v1.auth.session_exp_auth import SessionExpAuth
+from api.v1.auth.session_db_auth import SessionDBAuth
+from api.v1.auth.session_shm_auth import SessionShmAuth
+from api.v1.auth.session_token_auth import SessionTokenAuth
 
 
 app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
+EXCLUDED_PATHS = ExcludedPaths([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/'
+])
 
 if getenv('AUTH_TYPE') == 'auth':
     auth = Auth()
@@ -25,6 +34,12 @@ elif getenv('AUTH_TYPE') == 'session_auth':
     auth = SessionAuth()
 elif getenv('AUTH_TYPE') == 'session_exp_auth':
     auth = SessionExpAuth()
+elif getenv('AUTH_TYPE') == 'session_db_auth':
+    auth = SessionDBAuth()
+elif getenv('AUTH_TYPE') == 'session_shm_auth':
+    auth = SessionShmAuth()
+elif getenv('AUTH_TYPE') == 'session_token_auth':
+    auth = SessionTokenAuth()
 
 
 @app.errorhandler(404)
@@ -52,20 +67,11 @@ def forbidden(error) -> str:
 def before_request() -> None:
     """ Filter for request
     """
-    excluded_paths = [
-        '/api/v1/status/',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/',
-        '/api/v1/auth_session/login/'
-    ]
-
-    if auth and auth.require_auth(request.path, excluded_paths):
+    if auth and auth.require_auth(request.path, EXCLUDED_PATHS):
         if auth.authorization_header(request) is None and \
          auth.session_cookie(request) is None:
             abort(401)
-        request.current_user = auth.current_user(request)
-        if auth.current_user(request) is None:
-            abort(403)
+        request.current_user = auth.resolve_current_user(request)
         if request.current_user is None:
             abort(403)
 
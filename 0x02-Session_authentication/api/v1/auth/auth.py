@@ -1,44 +1,106 @@
 #!/usr/bin/env python3
 """ This module contains a class for API Authentication
 """
-from flask import request
+from flask import g, request
+from functools import lru_cache
 from os import getenv
-from typing import List, TypeVar
+from typing import List, Tuple, TypeVar, Union
 
 
-class Auth:
-    """ Class for managing the API authentication
+class ExcludedPaths:
+    """ Set of paths that don't require authentication, compiled once
+
+    Exact paths go in a set and wildcard paths (ending with `*`) in a
+    character trie of their prefixes, so matching a path costs O(len(path))
+    whatever the number of excluded paths.
     """
+    _END = ''
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def __init__(self, paths: List[str]):
+        """ Compile the excluded paths
         """
-        Method to check if the given path requires authentication
+        self._exact = set()
+        self._prefixes = {}
+        self._size = 0
+        for a_path in paths:
+            if not a_path:
+                continue
+            self._size += 1
+            a_path = self._normalize(a_path)
+            self._exact.add(a_path)
+            if a_path.endswith('*'):
+                node = self._prefixes
+                for char in a_path[:-1]:
+                    node = node.setdefault(char, {})
+                node[self._END] = True
+
+    def __len__(self) -> int:
+        """ Number of excluded paths
+        """
+        return self._size
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        """ Drop the trailing slash of a path, except for the root
+        """
+        if path[-1] == '/' and path != '/':
+            return path[:-1]
+        return path
+
+    def match(self, path: str) -> bool:
+        """
+        Check if a path is excluded from authentication
 
         Args:
             path (str): The path to check
-            excluded_paths (List[str]): A list of paths that don't require auth
 
         Returns:
-            bool: True if path requires auth, False otherwise
+            bool: True if the path is excluded, False otherwise
         """
-        if path is None or not excluded_paths:
+        path = self._normalize(path)
+        if path in self._exact:
             return True
+        node = self._prefixes
+        for char in path:
+            if self._END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self._END in node
 
-        if path[-1] == '/' and path != '/':
-            path = path[:-1]
 
-        for a_path in excluded_paths:
-            if a_path[-1] == '/' and a_path != '/':
-                a_path = a_path[:-1]
+@lru_cache(maxsize=32)
+def _compile_excluded_paths(paths: Tuple[str, ...]) -> ExcludedPaths:
+    """ Compile a list of excluded paths, cached per distinct list
+    """
+    return ExcludedPaths(list(paths))
 
-            if a_path.endswith('*'):
-                if path.startswith(a_path[:-1]):
-                    return False
 
-            if path == a_path:
-                return False
+class Auth:
+    """ Class for managing the API authentication
+    """
+    # Number of times the principal was actually resolved (not cached)
+    user_lookups = 0
 
-        return True
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], ExcludedPaths]) -> bool:
+        """
+        Method to check if the given path requires authentication
+
+        Args:
+            path (str): The path to check
+            excluded_paths (List[str] or ExcludedPaths): The paths that
+                don't require auth, ideally compiled once at startup
+
+        Returns:
+            bool: True if path requires auth, False otherwise
+        """
+        if not path or not excluded_paths:
+            return True
+        if not isinstance(excluded_paths, ExcludedPaths):
+            excluded_paths = _compile_excluded_paths(tuple(excluded_paths))
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """
@@ -65,6 +127,26 @@ class Auth:
         """
         return None
 
+    def resolve_current_user(self, request=None) -> TypeVar('User'):
+        """
+        Retrieves the current user once per request.
+
+        The result of `current_user` is cached on `flask.g`, so later
+        calls during the same request skip the credential checks.
+
+        Args:
+            request (Request): The request to check (default is None)
+
+        Returns:
+            User: The current user, or None if not found
+        """
+        if 'current_user' in g:
+            return g.current_user
+        user = self.current_user(request)
+        self.user_lookups += 1
+        g.current_user = user
+        return user
+
     def session_cookie(self, request=None):
         """
         Retrieves the session cookie from the request.
@@ -4,14 +4,99 @@
 from .auth import Auth
 import base64
 import binascii
+import hashlib
+from collections import OrderedDict
+from os import getenv, urandom
+from threading import Lock
+from time import monotonic
 from typing import TypeVar
 from models.user import User
 
 
+class CredentialCache:
+    """ Bounded LRU cache of verified Basic credentials with a TTL
+
+    Entries are keyed on a keyed hash of the Authorization header, so
+    the cache never holds the credentials themselves, and map to the ID,
+    email and password hash of the user they resolved to. An entry is
+    dropped as soon as that user is removed or its email or password
+    changes.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        """ Initialize
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._key = urandom(32)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def _digest(self, authorization_header: str) -> bytes:
+        """ Keyed hash of an Authorization header
+        """
+        return hashlib.blake2b(authorization_header.encode('utf-8'),
+                               key=self._key, digest_size=16).digest()
+
+    def get(self, authorization_header: str) -> TypeVar('User'):
+        """
+        Retrieves the User a header was verified for, if still valid.
+
+        Args:
+            authorization_header (str): The Authorization header.
+
+        Returns:
+            User: The cached User, or None on a miss.
+        """
+        if self.max_size <= 0:
+            return None
+        digest = self._digest(authorization_header)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            user_id, email, password, expires_at = entry
+            if expires_at < monotonic():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+        user = User.get(user_id)
+        if user is None or user.email != email or user.password != password:
+            with self._lock:
+                self._entries.pop(digest, None)
+            return None
+        return user
+
+    def put(self, authorization_header: str, user: TypeVar('User')):
+        """
+        Remembers the User a header was verified for.
+
+        Args:
+            authorization_header (str): The Authorization header.
+            user (User): The User the credentials belong to.
+        """
+        if self.max_size <= 0:
+            return
+        digest = self._digest(authorization_header)
+        with self._lock:
+            self._entries[digest] = (user.id, user.email, user.password,
+                                     monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
 class BasicAuth(Auth):
     """ This class inherits from the Auth class
     """
 
+    def __init__(self):
+        """ Initialize
+        """
+        self.credential_cache = CredentialCache(
+            int(getenv('BASIC_AUTH_CACHE_SIZE', 10000)),
+            float(getenv('BASIC_AUTH_CACHE_TTL', 60)))
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """
@@ -114,11 +199,18 @@ class BasicAuth(Auth):
         """
         auth_header = self.authorization_header(request)
         if auth_header:
+            user = self.credential_cache.get(auth_header)
+            if user is not None:
+                return user
             token = self.extract_base64_authorization_header(auth_header)
             if token:
                 dcd = self.decode_base64_authorization_header(token)
                 if dcd:
                     u_name, u_pwd = self.extract_user_credentials(dcd)
                     if u_name and u_pwd:
-                        return self.user_object_from_credentials(u_name, u_pwd)
+                        user = self.user_object_from_credentials(u_name,
+                                                                 u_pwd)
+                        if user is not None:
+                            self.credential_cache.put(auth_header, user)
+                        return user
         return
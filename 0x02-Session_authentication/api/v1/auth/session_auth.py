@@ -2,6 +2,8 @@
 """ Module contains a class that inherits from Auth.
 """
 from .auth import Auth
+from .session_store import SessionStore
+from os import getenv
 import uuid
 from models.user import User
 
@@ -9,7 +11,9 @@ from models.user import User
 class SessionAuth(Auth):
     """ This class inherits from Auth class.
     """
-    user_id_by_session_id = {}
+    # Thread-safe, expires sessions actively and caps their number
+    user_id_by_session_id = SessionStore(
+        int(getenv('SESSION_MAX_COUNT', 0)))
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -75,5 +79,13 @@ class SessionAuth(Auth):
         user_id = self.user_id_for_session_id(session_id)
         if user_id is None:
             return False
-        del self.user_id_by_session_id[session_id]
-        return True
+        return self.user_id_by_session_id.pop(session_id) is not None
+
+    def session_metrics(self) -> dict:
+        """
+        Counters of the session storage, reported by /stats.
+
+        Returns:
+            dict: the metrics of the store holding the sessions.
+        """
+        return self.user_id_by_session_id.metrics()
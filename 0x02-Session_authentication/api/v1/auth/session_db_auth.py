@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+""" This module contains a session authentication persisted in the database
+"""
+from .session_exp_auth import SessionExpAuth, _int_env
+from .session_store import SessionStore
+from calendar import timegm
+from contextlib import contextmanager
+from os import stat
+from time import time
+import uuid
+from models.user_session import UserSession
+
+
+class SessionDBAuth(SessionExpAuth):
+    """ Sessions stored as UserSession objects, so they survive restarts
+    and are shared by every worker using the same files
+
+    Resolved sessions are kept in an in-process cache for
+    SESSION_DB_CACHE_TTL seconds, so most requests never look at the
+    files. On a cache miss, the files are only read if they changed
+    since the last look. With DB_PERSISTENCE=journal, only the records
+    other workers appended meanwhile are read, and the whole table is
+    reloaded only after a journal compaction. In the other modes every
+    write rewrites the snapshot, so a miss following any login, logout
+    or idle refresh anywhere reloads the whole table: journal mode is
+    the one to use with several workers. A session destroyed by another
+    worker may still be accepted here until its cache entry expires.
+    Writes and journal compactions are serialized across processes with
+    the lock file of UserSession. DB_PERSISTENCE=write_behind can't be
+    shared: each worker would flush its own copy over the others'.
+    """
+    files = (".db_UserSession.json", ".db_UserSession.journal")
+
+    def __init__(self):
+        """ Initialize
+        """
+        super().__init__()
+        self.cache = SessionStore(_int_env('SESSION_MAX_COUNT'))
+        self.cache_ttl = _int_env('SESSION_DB_CACHE_TTL', 5)
+        self._signature = None
+        self._reload()
+
+    def create_session(self, user_id=None):
+        """
+        Creates a session for a user and stores it in the database.
+
+        Args:
+            user_id (str): The id of the user to create a session for.
+
+        Returns:
+            str: The session ID.
+        """
+        if user_id is None or type(user_id) is not str:
+            return None
+        session_id = str(uuid.uuid4())
+        user_session = UserSession(user_id=user_id, session_id=session_id)
+        with self._write_lock():
+            user_session.save()
+        self._cache(user_session)
+        return session_id
+
+    def user_id_for_session_id(self, session_id=None):
+        """
+        Retrieves the User ID based on a Session ID.
+
+        Args:
+            session_id (str): The Session ID to look up.
+
+        Returns:
+            str: The User ID related to the Session ID.
+        """
+        if session_id is None or type(session_id) is not str:
+            return None
+        user_id = self.cache.get(session_id)
+        if user_id is not None:
+            return user_id
+        self._reload()
+        user_session = self._find(session_id)
+        if user_session is None:
+            return None
+        now = int(time())
+        if self._deadline(user_session) <= now:
+            with self._write_lock():
+                user_session = self._find(session_id)
+                if user_session is not None:
+                    user_session.remove()
+            return None
+        if self.idle_timeout > 0 and \
+                now - _epoch(user_session.updated_at) >= \
+                self.refresh_interval:
+            with self._write_lock():
+                user_session = self._find(session_id)
+                if user_session is None:
+                    return None
+                user_session.save()
+        return self._cache(user_session)
+
+    def destroy_session(self, request=None):
+        """
+        Destroys the user's session by removing it from the database.
+
+        Args:
+            request: the request to check, default is None.
+        """
+        if request is None:
+            return False
+        session_id = self.session_cookie(request)
+        if session_id is None:
+            return False
+        if self.user_id_for_session_id(session_id) is None:
+            return False
+        self.cache.pop(session_id)
+        with self._write_lock():
+            user_session = self._find(session_id)
+            if user_session is None:
+                return False
+            user_session.remove()
+        return True
+
+    @property
+    def user_id_by_session_id(self) -> SessionStore:
+        """ The session cache, whose metrics /stats reports
+        """
+        return self.cache
+
+    def _find(self, session_id: str):
+        """ UserSession of a session ID, None if it doesn't exist
+        """
+        user_sessions = UserSession.search({'session_id': session_id})
+        return user_sessions[0] if user_sessions else None
+
+    def _deadline(self, user_session) -> int:
+        """ When a session expires, in seconds since the epoch
+        """
+        deadlines = [float('inf')]
+        if self.session_duration > 0:
+            deadlines.append(_epoch(user_session.created_at) +
+                             self.session_duration)
+        if self.idle_timeout > 0:
+            deadlines.append(_epoch(user_session.updated_at) +
+                             self.idle_timeout)
+        return min(deadlines)
+
+    def _cache(self, user_session) -> str:
+        """ Keep the user ID of a session in the cache until the cache TTL
+        or the session's own expiry, whichever comes first
+        """
+        ttl = min(self.cache_ttl, self._deadline(user_session) - time())
+        if ttl > 0:
+            self.cache.set(user_session.session_id, user_session.user_id,
+                           ttl)
+        return user_session.user_id
+
+    def _reload(self):
+        """ Reload the sessions if another process changed their files
+        """
+        signature = self._file_signature()
+        if signature != self._signature:
+            if not UserSession.refresh_from_journal():
+                UserSession.load_from_file()
+            self._signature = signature
+
+    def _file_signature(self) -> list:
+        """ Inode, size and modification time of the session files
+        """
+        signature = []
+        for file_path in self.files:
+            try:
+                st = stat(file_path)
+                signature.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return signature
+
+    @contextmanager
+    def _write_lock(self):
+        """ Exclusive lock held across processes while sessions are written
+
+        The sessions are brought up to date first, so a write never drops
+        the changes of another process, and our own write doesn't count
+        as a change to reload.
+        """
+        with UserSession.file_lock():
+            self._reload()
+            yield
+            self._signature = self._file_signature()
+
+
+def _epoch(value) -> int:
+    """ Seconds since the epoch of a naive UTC datetime
+    """
+    return timegm(value.utctimetuple())
@@ -3,21 +3,30 @@
 """
 from .session_auth import SessionAuth
 from os import getenv
-from datetime import datetime, timedelta
+from time import monotonic
 
 
 class SessionExpAuth(SessionAuth):
     """ This class inherits from the SessionAuth class
+
+    SESSION_DURATION is the absolute lifetime of a session. When
+    SESSION_IDLE_TIMEOUT is set, a session also expires after that many
+    seconds without use, and each use slides it forward. To keep the hot
+    path cheap, a session is only refreshed in the store once its last
+    refresh is SESSION_REFRESH_INTERVAL seconds old, so the idle timeout
+    is honoured within that interval. Times are integer seconds on the
+    monotonic clock.
     """
 
     def __init__(self):
         """ Initialize
         """
-        try:
-            session_duration = int(getenv('SESSION_DURATION'))
-        except Exception:
-            session_duration = 0
-        self.session_duration = session_duration
+        self.session_duration = _int_env('SESSION_DURATION')
+        self.idle_timeout = _int_env('SESSION_IDLE_TIMEOUT')
+        refresh_interval = _int_env('SESSION_REFRESH_INTERVAL', -1)
+        if refresh_interval < 0:
+            refresh_interval = max(1, self.idle_timeout // 10)
+        self.refresh_interval = refresh_interval
 
     def create_session(self, user_id=None):
         """
@@ -33,16 +42,21 @@ class SessionExpAuth(SessionAuth):
         session_id = super().create_session(user_id)
         if session_id is None:
             return None
-        SessionAuth.user_id_by_session_id[session_id] = {
+        now = int(monotonic())
+        SessionAuth.user_id_by_session_id.set(session_id, {
             "user_id": user_id,
-            "created_at": datetime.now()
-        }
+            "created_at": now,
+            "refreshed_at": now
+        }, self._ttl(now, now))
         return session_id
 
     def user_id_for_session_id(self, session_id=None):
         """
         Retrieves the User ID based on a Session ID.
 
+        The store drops expired sessions, so this only has to slide the
+        idle timeout of the sessions still alive.
+
         Args:
             session_id (str): The Session ID to look up.
 
@@ -51,15 +65,37 @@ class SessionExpAuth(SessionAuth):
         """
         if session_id is None:
             return None
-        if session_id not in SessionAuth.user_id_by_session_id.keys():
-            return None
-        session_dict = SessionAuth.user_id_by_session_id[session_id]
-        if self.session_duration <= 0:
-            return session_dict['user_id']
-        if 'created_at' not in session_dict.keys():
-            return None
-        created_time = session_dict['created_at']
-        time_delta = timedelta(seconds=self.session_duration)
-        if (created_time + time_delta) < datetime.now():
+        session_dict = SessionAuth.user_id_by_session_id.get(session_id)
+        if session_dict is None:
             return None
+        if self.idle_timeout > 0:
+            now = int(monotonic())
+            if now - session_dict['refreshed_at'] >= self.refresh_interval:
+                session_dict['refreshed_at'] = now
+                SessionAuth.user_id_by_session_id.touch(
+                    session_id, self._ttl(session_dict['created_at'], now))
         return session_dict['user_id']
+
+    def _ttl(self, created_at: int, now: int):
+        """
+        Seconds a session may still live, None if it never expires.
+
+        Args:
+            created_at (int): When the session was created.
+            now (int): The current time.
+        """
+        ttls = []
+        if self.idle_timeout > 0:
+            ttls.append(self.idle_timeout)
+        if self.session_duration > 0:
+            ttls.append(created_at + self.session_duration - now)
+        return min(ttls) if ttls else None
+
+
+def _int_env(name: str, default: int = 0) -> int:
+    """ Integer environment variable, `default` if unset or invalid
+    """
+    try:
+        return int(getenv(name))
+    except Exception:
+        return default
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" This module contains a session authentication shared by the processes
+of a host
+"""
+from .session_exp_auth import SessionExpAuth, _int_env
+from .shared_session_table import SharedSessionTable
+from os import getenv
+from time import monotonic
+import uuid
+
+
+class SessionShmAuth(SessionExpAuth):
+    """ Sessions kept in a SharedSessionTable, so every worker process on
+    the host can serve every session
+
+    The table lives in SESSION_SHM_PATH (a file under /dev/shm by
+    default) and holds up to SESSION_SHM_CAPACITY sessions. Expiry
+    follows SessionExpAuth; times are integer seconds on the monotonic
+    clock, which all processes of a host share. The file must not
+    outlive a reboot, which is why it belongs in /dev/shm.
+    """
+
+    def __init__(self):
+        """ Initialize
+        """
+        super().__init__()
+        self.table = SharedSessionTable(
+            getenv('SESSION_SHM_PATH', '/dev/shm/session_table'),
+            _int_env('SESSION_SHM_CAPACITY', 65536))
+
+    @property
+    def user_id_by_session_id(self) -> SharedSessionTable:
+        """ The session table, whose metrics /stats reports
+        """
+        return self.table
+
+    def create_session(self, user_id=None):
+        """
+        Creates a session for a user.
+
+        Args:
+            user_id (str): The id of the user to create a session for.
+
+        Returns:
+            str: The session ID.
+        """
+        if user_id is None or type(user_id) is not str:
+            return None
+        session_id = str(uuid.uuid4())
+        self.table.set(session_id, user_id, int(monotonic()))
+        return session_id
+
+    def user_id_for_session_id(self, session_id=None):
+        """
+        Retrieves the User ID based on a Session ID.
+
+        Args:
+            session_id (str): The Session ID to look up.
+
+        Returns:
+            str: The User ID related to the Session ID.
+        """
+        if session_id is None or type(session_id) is not str:
+            return None
+        entry = self.table.get(session_id)
+        if entry is None:
+            return None
+        user_id, created, last_seen = entry
+        if self.session_duration <= 0 and self.idle_timeout <= 0:
+            return user_id
+        now = int(monotonic())
+        if 0 < self.session_duration <= now - created or \
+                0 < self.idle_timeout <= now - last_seen:
+            self.table.pop(session_id)
+            return None
+        if self.idle_timeout > 0 and \
+                now - last_seen >= self.refresh_interval:
+            self.table.touch(session_id, now)
+        return user_id
+
+    def destroy_session(self, request=None):
+        """
+        Destroys the user's session by removing it from the table.
+
+        Args:
+            request: the request to check, default is None.
+        """
+        if request is None:
+            return False
+        session_id = self.session_cookie(request)
+        if session_id is None:
+            return False
+        return self.table.pop(session_id) is not None
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+""" This module contains an in-memory session store with active expiry
+"""
+from collections import OrderedDict
+from heapq import heappop, heappush
+from threading import RLock
+from time import monotonic
+
+
+class SessionStore:
+    """ Dict-like map of session IDs with expiry and a size cap
+
+    Sessions with a TTL are filed in time buckets of `granularity`
+    seconds. Every access first drops the buckets that are entirely in
+    the past, so each session is expired exactly once and the cost is
+    amortised O(1). When `max_sessions` is set, the least recently used
+    sessions are evicted to stay under it.
+    """
+
+    def __init__(self, max_sessions: int = 0, granularity: float = 1):
+        """ Initialize
+        """
+        self.max_sessions = max_sessions
+        self.granularity = granularity
+        # session ID -> [value, expires_at or None, bucket or None]
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._bucket_heap = []
+        self._lock = RLock()
+        self.expired_count = 0
+        self.evicted_count = 0
+
+    def set(self, session_id: str, value, ttl: float = None):
+        """
+        Stores a session, optionally expiring `ttl` seconds from now.
+
+        Args:
+            session_id (str): The session ID.
+            value: The data of the session.
+            ttl (float): The lifetime of the session, None for no expiry.
+        """
+        with self._lock:
+            self._expire_due()
+            self._discard(session_id)
+            entry = [value, None, None]
+            self._entries[session_id] = entry
+            if ttl is not None:
+                self._schedule(session_id, entry, monotonic() + ttl)
+            while self.max_sessions > 0 and \
+                    len(self._entries) > self.max_sessions:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evicted_count += 1
+
+    def touch(self, session_id: str, ttl: float) -> bool:
+        """
+        Pushes back the expiry of a session to `ttl` seconds from now.
+
+        Returns:
+            bool: False if the session doesn't exist.
+        """
+        with self._lock:
+            entry = self._live_entry(session_id)
+            if entry is None:
+                return False
+            self._unschedule(session_id, entry)
+            self._schedule(session_id, entry, monotonic() + ttl)
+            return True
+
+    def get(self, session_id: str, default=None):
+        """
+        Retrieves the data of a live session.
+
+        Args:
+            session_id (str): The session ID.
+            default: The value returned if the session doesn't exist.
+
+        Returns:
+            The data of the session, or `default`.
+        """
+        with self._lock:
+            entry = self._live_entry(session_id)
+            if entry is None:
+                return default
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def pop(self, session_id: str, default=None):
+        """
+        Removes a session and returns its data, or `default`.
+        """
+        with self._lock:
+            entry = self._live_entry(session_id)
+            if entry is None:
+                return default
+            self._discard(session_id)
+            return entry[0]
+
+    def __setitem__(self, session_id: str, value):
+        """ Stores a session that never expires
+        """
+        self.set(session_id, value)
+
+    def __getitem__(self, session_id: str):
+        """ Retrieves the data of a live session, KeyError otherwise
+        """
+        with self._lock:
+            entry = self._live_entry(session_id)
+            if entry is None:
+                raise KeyError(session_id)
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def __delitem__(self, session_id: str):
+        """ Removes a session, KeyError if it doesn't exist
+        """
+        with self._lock:
+            if self._live_entry(session_id) is None:
+                raise KeyError(session_id)
+            self._discard(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        """ Checks if a session is live
+        """
+        with self._lock:
+            return self._live_entry(session_id) is not None
+
+    def __len__(self) -> int:
+        """ Number of sessions not expired yet
+        """
+        with self._lock:
+            self._expire_due()
+            return len(self._entries)
+
+    def keys(self):
+        """ IDs of the sessions not expired yet
+        """
+        with self._lock:
+            self._expire_due()
+            return list(self._entries.keys())
+
+    def metrics(self) -> dict:
+        """
+        Counters of the store.
+
+        Returns:
+            dict: live sessions, sessions expired and sessions evicted to
+                respect `max_sessions`.
+        """
+        with self._lock:
+            self._expire_due()
+            return {
+                "live": len(self._entries),
+                "expired": self.expired_count,
+                "evicted": self.evicted_count,
+            }
+
+    def _live_entry(self, session_id: str):
+        """ Entry of a session, dropping it if it has expired
+        """
+        self._expire_due()
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= monotonic():
+            self._discard(session_id)
+            self.expired_count += 1
+            return None
+        return entry
+
+    def _schedule(self, session_id: str, entry: list, expires_at: float):
+        """ File a session in the bucket of its expiry time
+        """
+        bucket = int(expires_at // self.granularity)
+        entry[1] = expires_at
+        entry[2] = bucket
+        if bucket not in self._buckets:
+            self._buckets[bucket] = set()
+            heappush(self._bucket_heap, bucket)
+        self._buckets[bucket].add(session_id)
+
+    def _unschedule(self, session_id: str, entry: list):
+        """ Take a session out of its expiry bucket
+        """
+        if entry[2] is not None:
+            self._buckets.get(entry[2], set()).discard(session_id)
+            entry[1] = entry[2] = None
+
+    def _discard(self, session_id: str):
+        """ Remove a session and its expiry bucket registration
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._unschedule(session_id, entry)
+
+    def _expire_due(self):
+        """ Drop every session of the buckets that ended in the past
+        """
+        current = int(monotonic() // self.granularity)
+        heap = self._bucket_heap
+        while heap and heap[0] < current:
+            bucket = heappop(heap)
+            for session_id in self._buckets.pop(bucket, ()):
+                if self._entries.pop(session_id, None) is not None:
+                    self.expired_count += 1
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+""" This module contains a stateless session authentication with signed
+tokens
+"""
+from .session_exp_auth import SessionExpAuth, _int_env
+from .session_store import SessionStore
+from contextlib import contextmanager
+from os import fstat, getenv, path, replace, stat, urandom
+from tempfile import mkstemp
+from time import monotonic, time
+import base64
+import fcntl
+import hashlib
+import hmac
+
+
+class SessionTokenAuth(SessionExpAuth):
+    """ Sessions carried by the cookie itself as HMAC-signed tokens
+
+    A token is `<key id>.<payload>.<signature>`, where the payload holds
+    the user ID, the issue and expiry times and a random token ID, and
+    the signature is an HMAC-SHA256 of the key ID and payload. Any server
+    with the keys can validate a token without shared storage.
+
+    SESSION_SIGNING_KEYS lists `<key id>:<secret>` pairs separated by
+    commas: the first one signs new tokens, all of them are accepted, so
+    keys are rotated by prepending a new one and dropping the oldest
+    once its tokens have expired. Without it, a random key is used and
+    tokens are only valid in this process.
+
+    Tokens expire SESSION_DURATION seconds after they are issued, or
+    after `default_duration` when it isn't set: a token that never
+    expires could never be forgotten once revoked. Being stateless, they
+    can't slide with SESSION_IDLE_TIMEOUT. A logout revokes the token ID
+    until the token expires, in this process and, when
+    SESSION_REVOCATION_FILE is set, in every process reading that file.
+    The file is checked for changes at most every
+    SESSION_REVOCATION_CHECK_INTERVAL seconds, and rewritten without its
+    expired entries once they outnumber the live ones.
+    """
+    signing_key_id = None
+    default_duration = 24 * 3600
+    # Expired revocations tolerated in the file before it is compacted
+    revocation_slack = 100
+
+    def __init__(self):
+        """ Initialize
+        """
+        super().__init__()
+        if self.session_duration <= 0:
+            self.session_duration = self.default_duration
+        self.keys = {}
+        for pair in getenv('SESSION_SIGNING_KEYS', '').split(','):
+            key_id, sep, secret = pair.strip().partition(':')
+            if sep and key_id and secret:
+                self.keys.setdefault(key_id, secret.encode())
+                self.signing_key_id = self.signing_key_id or key_id
+        if not self.keys:
+            self.signing_key_id = 'local'
+            self.keys['local'] = urandom(32)
+        # Keyed once: signing copies these instead of rekeying every time
+        self._macs = {key_id: hmac.new(secret, digestmod=hashlib.sha256)
+                      for key_id, secret in self.keys.items()}
+        self.revoked = SessionStore()
+        self.revocation_file = getenv('SESSION_REVOCATION_FILE')
+        self.revocation_check_interval = _int_env(
+            'SESSION_REVOCATION_CHECK_INTERVAL', 1)
+        self._revocation_signature = None
+        self._revocation_checked_at = None
+
+    def create_session(self, user_id=None):
+        """
+        Issues a signed token for a user.
+
+        Args:
+            user_id (str): The id of the user to create a session for.
+
+        Returns:
+            str: The token, used as session ID.
+        """
+        if user_id is None or type(user_id) is not str:
+            return None
+        issued_at = int(time())
+        expires_at = issued_at + self.session_duration
+        payload = _b64encode("{}:{}:{}:{}".format(
+            _b64encode(urandom(12)), issued_at, expires_at,
+            user_id).encode())
+        key_id = self.signing_key_id
+        return "{}.{}.{}".format(key_id, payload,
+                                 self._sign(key_id, payload))
+
+    def user_id_for_session_id(self, session_id=None):
+        """
+        Retrieves the User ID of a valid token.
+
+        Args:
+            session_id (str): The token to validate.
+
+        Returns:
+            str: The User ID of the token, None if it's forged, expired
+                or revoked.
+        """
+        claims = self._claims(session_id)
+        return claims[3] if claims is not None else None
+
+    def destroy_session(self, request=None):
+        """
+        Revokes the token of the request until it expires.
+
+        Args:
+            request: the request to check, default is None.
+        """
+        if request is None:
+            return False
+        claims = self._claims(self.session_cookie(request))
+        if claims is None:
+            return False
+        token_id, _, expires_at, _ = claims
+        self.revoked.set(token_id, True, expires_at - time())
+        if self.revocation_file:
+            with self._revocation_lock() as f:
+                f.write("{} {}\n".format(token_id, expires_at))
+        return True
+
+    def session_metrics(self) -> dict:
+        """
+        Counters of the token sessions, reported by /stats. Live sessions
+        are not tracked: only revoked tokens are stored.
+
+        Returns:
+            dict: the number of revoked tokens not expired yet.
+        """
+        return {"revoked": len(self.revoked)}
+
+    def _claims(self, token: str):
+        """ (token ID, issued at, expires at, user ID) of a valid token
+        """
+        if token is None or type(token) is not str or not token.isascii():
+            return None
+        parts = token.split('.')
+        if len(parts) != 3 or parts[0] not in self.keys:
+            return None
+        key_id, payload, signature = parts
+        if not hmac.compare_digest(self._sign(key_id, payload), signature):
+            return None
+        try:
+            claims = base64.urlsafe_b64decode(
+                payload + '=' * (-len(payload) % 4)).decode()
+            token_id, issued_at, expires_at, user_id = claims.split(':', 3)
+            expires_at = int(expires_at)
+        except ValueError:
+            return None
+        # Tokens issued without an expiry time are no longer accepted
+        if expires_at <= time():
+            return None
+        if self.revocation_file:
+            self._load_revocations()
+        if token_id in self.revoked:
+            return None
+        return token_id, int(issued_at), expires_at, user_id
+
+    def _sign(self, key_id: str, payload: str) -> str:
+        """ Signature of a payload with one of the keys
+        """
+        mac = self._macs[key_id].copy()
+        mac.update("{}.{}".format(key_id, payload).encode())
+        return _b64encode(mac.digest())
+
+    def _load_revocations(self):
+        """ Read the revocation file again if it changed, looking at it at
+        most every `revocation_check_interval` seconds
+        """
+        checked_at = monotonic()
+        if self._revocation_checked_at is not None and \
+                checked_at - self._revocation_checked_at < \
+                self.revocation_check_interval:
+            return
+        self._revocation_checked_at = checked_at
+        try:
+            st = stat(self.revocation_file)
+        except OSError:
+            return
+        signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if signature == self._revocation_signature:
+            return
+        self._revocation_signature = signature
+        now = time()
+        expired = 0
+        with open(self.revocation_file) as f:
+            for line in f:
+                try:
+                    token_id, expires_at = line.split()
+                    expires_at = int(expires_at)
+                except ValueError:
+                    expired += 1
+                    continue
+                if expires_at > now:
+                    self.revoked.set(token_id, True, expires_at - now)
+                else:
+                    expired += 1
+        if expired > len(self.revoked) + self.revocation_slack:
+            self._compact_revocations()
+
+    def _compact_revocations(self):
+        """ Rewrite the revocation file with its live entries only
+        """
+        with self._revocation_lock() as f:
+            now = time()
+            f.seek(0)
+            live = []
+            for line in f:
+                try:
+                    _, expires_at = line.split()
+                    if int(expires_at) > now:
+                        live.append(line)
+                except ValueError:
+                    continue
+            dir_path = path.dirname(path.abspath(self.revocation_file))
+            fd, tmp_path = mkstemp(dir=dir_path, suffix=".tmp")
+            with open(fd, 'w') as tmp:
+                tmp.writelines(live)
+            replace(tmp_path, self.revocation_file)
+
+    @contextmanager
+    def _revocation_lock(self):
+        """ The revocation file, opened for appending and exclusively
+        locked across processes
+
+        A compaction replaces the file: a process that opened it before
+        then finds another inode at the path and opens the new file.
+        """
+        while True:
+            f = open(self.revocation_file, 'a+')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    current = stat(self.revocation_file).st_ino
+                except FileNotFoundError:
+                    current = None
+                if current == fstat(f.fileno()).st_ino:
+                    yield f
+                    return
+            finally:
+                f.close()
+
+
+def _b64encode(data: bytes) -> str:
+    """ URL-safe base64 without padding, fit for a cookie
+    """
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+""" This module contains a session table shared by processes through mmap
+"""
+from contextlib import contextmanager
+from hashlib import blake2b
+from os import O_CREAT, O_RDWR, close, fstat, ftruncate, open as os_open
+from threading import Lock
+import fcntl
+import mmap
+import struct
+
+# File header: magic, number of buckets, slots per bucket
+FILE_HEADER = struct.Struct('<8sII')
+FILE_HEADER_SIZE = 64
+MAGIC = b'SESSTBL1'
+# Bucket header: sequence counter, then the key hash of every slot
+# (0 for an empty slot)
+WAYS = 8
+BUCKET_HEADER = struct.Struct('<I4x{}Q'.format(WAYS))
+SEQ = struct.Struct('<I')
+HASH = struct.Struct('<Q')
+# Slot: created, last seen, session ID, user ID
+ENTRY = struct.Struct('<qq64s64s')
+BUCKET_SIZE = BUCKET_HEADER.size + WAYS * ENTRY.size
+# Lock-free read attempts before a reader waits for the bucket lock
+READ_SPINS = 100
+
+
+class SharedSessionTable:
+    """ Fixed-size hash table of sessions in a memory-mapped file
+
+    Every process that maps the same file sees the same sessions. The
+    table is split into buckets of WAYS slots and a session ID only ever
+    lives in the bucket its hash selects; when that bucket is full, the
+    session seen least recently is evicted.
+
+    Reads take no lock: each bucket has a sequence counter that writers
+    make odd while they modify the bucket, and a reader retries until it
+    sees the same even value before and after reading. Writers lock only
+    their bucket, with a thread lock and an fcntl lock on its byte range.
+    """
+
+    def __init__(self, file_path: str, capacity: int = 65536):
+        """
+        Opens the table, creating it if the file doesn't exist yet.
+
+        Args:
+            file_path (str): The file to map, normally under /dev/shm.
+            capacity (int): The number of sessions of a new table. An
+                existing table keeps the capacity it was created with.
+        """
+        self.file_path = file_path
+        self._fd = os_open(file_path, O_RDWR | O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self.buckets = self._open(max(1, -(-capacity // WAYS)))
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        except BaseException:
+            close(self._fd)
+            raise
+        self.capacity = self.buckets * WAYS
+        self._mm = mmap.mmap(self._fd, FILE_HEADER_SIZE +
+                             self.buckets * BUCKET_SIZE)
+        self._thread_locks = [Lock() for _ in range(64)]
+
+    def _open(self, buckets: int) -> int:
+        """ Initialize an empty file, or check the header of an existing
+        one, and return its number of buckets
+        """
+        if fstat(self._fd).st_size == 0:
+            ftruncate(self._fd, FILE_HEADER_SIZE + buckets * BUCKET_SIZE)
+            with mmap.mmap(self._fd, FILE_HEADER_SIZE) as mm:
+                FILE_HEADER.pack_into(mm, 0, MAGIC, buckets, WAYS)
+            return buckets
+        with mmap.mmap(self._fd, FILE_HEADER_SIZE) as mm:
+            magic, buckets, ways = FILE_HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or ways != WAYS:
+            raise ValueError("{} is not a session table".format(
+                self.file_path))
+        return buckets
+
+    def get(self, session_id: str):
+        """
+        Retrieves a session.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            tuple: (user ID, created, last seen), or None.
+        """
+        key = session_id.encode()
+        key_hash = _hash(key)
+        offset = self._offset(key_hash)
+        mm = self._mm
+        for _ in range(READ_SPINS):
+            header = BUCKET_HEADER.unpack_from(mm, offset)
+            if header[0] & 1:
+                continue
+            entry = self._read(offset, header, key, key_hash)
+            if SEQ.unpack_from(mm, offset)[0] == header[0]:
+                return entry
+        # A writer is slow or died mid-write: read under its lock
+        with self._locked(offset):
+            header = BUCKET_HEADER.unpack_from(mm, offset)
+            return self._read(offset, header, key, key_hash)
+
+    def set(self, session_id: str, user_id: str, now: int):
+        """
+        Stores a session created and last seen at `now`.
+
+        Raises ValueError if an ID is longer than 64 bytes.
+        """
+        key = session_id.encode()
+        value = user_id.encode()
+        if len(key) > 64 or len(value) > 64:
+            raise ValueError("IDs are limited to 64 bytes")
+        key_hash = _hash(key)
+        offset = self._offset(key_hash)
+        with self._locked(offset):
+            slot = self._slot(offset, key, key_hash)
+            if slot is None:
+                slot = self._victim(offset)
+            self._write(offset, slot, key_hash,
+                        ENTRY.pack(now, now, key, value))
+
+    def touch(self, session_id: str, now: int) -> bool:
+        """
+        Sets the last seen time of a session.
+
+        Returns:
+            bool: False if the session doesn't exist.
+        """
+        key = session_id.encode()
+        key_hash = _hash(key)
+        offset = self._offset(key_hash)
+        with self._locked(offset):
+            slot = self._slot(offset, key, key_hash)
+            if slot is None:
+                return False
+            entry_offset = offset + BUCKET_HEADER.size + slot * ENTRY.size
+            created, _, stored_key, value = ENTRY.unpack_from(
+                self._mm, entry_offset)
+            self._write(offset, slot, key_hash,
+                        ENTRY.pack(created, now, stored_key, value))
+            return True
+
+    def pop(self, session_id: str):
+        """
+        Removes a session.
+
+        Returns:
+            str: The user ID of the session, or None.
+        """
+        key = session_id.encode()
+        key_hash = _hash(key)
+        offset = self._offset(key_hash)
+        with self._locked(offset):
+            slot = self._slot(offset, key, key_hash)
+            if slot is None:
+                return None
+            entry_offset = offset + BUCKET_HEADER.size + slot * ENTRY.size
+            value = ENTRY.unpack_from(self._mm, entry_offset)[3]
+            self._write(offset, slot, 0, None)
+            return value.rstrip(b'\0').decode()
+
+    def metrics(self) -> dict:
+        """
+        Counters of the table. Scans every bucket, meant for /stats.
+
+        Returns:
+            dict: live sessions and the capacity of the table.
+        """
+        live = 0
+        for bucket in range(self.buckets):
+            offset = FILE_HEADER_SIZE + bucket * BUCKET_SIZE
+            header = BUCKET_HEADER.unpack_from(self._mm, offset)
+            live += WAYS - header[1:].count(0)
+        return {"live": live, "capacity": self.capacity}
+
+    def close(self):
+        """ Unmaps the table
+        """
+        self._mm.close()
+        close(self._fd)
+
+    def _offset(self, key_hash: int) -> int:
+        """ Offset of the bucket of a key hash
+        """
+        return FILE_HEADER_SIZE + (key_hash % self.buckets) * BUCKET_SIZE
+
+    def _read(self, offset: int, header: tuple, key: bytes, key_hash: int):
+        """ Entry of a key in a bucket whose header was just read
+        """
+        slot = 0
+        while True:
+            try:
+                slot = header.index(key_hash, slot + 1)
+            except ValueError:
+                return None
+            created, last_seen, stored_key, value = ENTRY.unpack_from(
+                self._mm, offset + BUCKET_HEADER.size +
+                (slot - 1) * ENTRY.size)
+            if stored_key.rstrip(b'\0') == key:
+                return value.rstrip(b'\0').decode(), created, last_seen
+
+    def _slot(self, offset: int, key: bytes, key_hash: int):
+        """ Slot of a key in a locked bucket, None if it isn't there
+        """
+        header = BUCKET_HEADER.unpack_from(self._mm, offset)
+        for slot in range(WAYS):
+            if header[slot + 1] != key_hash:
+                continue
+            entry_offset = offset + BUCKET_HEADER.size + slot * ENTRY.size
+            if ENTRY.unpack_from(self._mm, entry_offset)[2] \
+                    .rstrip(b'\0') == key:
+                return slot
+        return None
+
+    def _victim(self, offset: int) -> int:
+        """ An empty slot of a locked bucket, else the one seen least
+        recently
+        """
+        header = BUCKET_HEADER.unpack_from(self._mm, offset)
+        if 0 in header[1:]:
+            return header.index(0, 1) - 1
+        return min(range(WAYS), key=lambda slot: ENTRY.unpack_from(
+            self._mm, offset + BUCKET_HEADER.size + slot * ENTRY.size)[1])
+
+    def _write(self, offset: int, slot: int, key_hash: int, entry):
+        """ Replace a slot of a locked bucket, `entry` None to empty it
+        """
+        mm = self._mm
+        seq = SEQ.unpack_from(mm, offset)[0]
+        # Odd while writing, even again once done; a counter left odd by
+        # a writer that died mid-write is fixed by the next one
+        SEQ.pack_into(mm, offset, (seq | 1) & 0xffffffff)
+        if entry is not None:
+            mm[offset + BUCKET_HEADER.size + slot * ENTRY.size:
+               offset + BUCKET_HEADER.size + (slot + 1) * ENTRY.size] = entry
+        HASH.pack_into(mm, offset + 8 + slot * HASH.size, key_hash)
+        SEQ.pack_into(mm, offset, ((seq | 1) + 1) & 0xffffffff)
+
+    @contextmanager
+    def _locked(self, offset: int):
+        """ Hold the lock of a bucket, across threads and processes
+
+        fcntl locks belong to the process, so threads also take a
+        striped thread lock.
+        """
+        bucket = (offset - FILE_HEADER_SIZE) // BUCKET_SIZE
+        with self._thread_locks[bucket % len(self._thread_locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, BUCKET_SIZE, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, BUCKET_SIZE, offset)
+
+
+def _hash(key: bytes) -> int:
+    """ Non-zero 64-bit hash of a key, the same in every process
+    """
+    return int.from_bytes(blake2b(key, digest_size=8).digest(),
+                          'little') or 1
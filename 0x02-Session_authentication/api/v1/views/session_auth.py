@@ -2,7 +2,7 @@
 """ This module contains the endpoint for session login
 """
 from api.v1.views import app_views
-from flask import jsonify, request
+from flask import abort, jsonify, request
 from models.user import User
 from os import getenv
 
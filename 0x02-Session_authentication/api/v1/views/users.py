@@ -2,18 +2,107 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, stream_with_context
 from models.user import User
+import json
+
+STREAM_CHUNK_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+
+def _project(user: User, fields: list) -> dict:
+    """ JSON representation of a User restricted to the requested fields
+    """
+    user_json = user.to_json()
+    if fields is None:
+        return user_json
+    return {k: user_json[k] for k in fields if k in user_json}
+
+
+def _stream_users(position: int, user_ids: list, fields: list):
+    """ Generate a JSON array of Users chunk by chunk
+
+    With `user_ids`, only those users are sent; otherwise every user
+    from `position` on is, reading STREAM_CHUNK_SIZE IDs at a time.
+    Objects are serialized as the response is sent, and users removed
+    meanwhile are skipped.
+    """
+    yield "["
+    first = True
+    while True:
+        if user_ids is not None:
+            chunk_ids = user_ids[:STREAM_CHUNK_SIZE]
+            user_ids = user_ids[STREAM_CHUNK_SIZE:]
+        else:
+            chunk_ids, position = User.ids_from(position, STREAM_CHUNK_SIZE)
+        if not chunk_ids:
+            break
+        chunk = []
+        for user_id in chunk_ids:
+            user = User.get(user_id)
+            if user is not None:
+                chunk.append(json.dumps(_project(user, fields)))
+        if chunk:
+            yield ("" if first else ",") + ",".join(chunk)
+            first = False
+    yield "]\n"
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (all optional):
+      - limit: maximum number of users to return, at most MAX_PAGE_SIZE
+      - after: ID of the last user of the previous page (cursor)
+      - fields: comma separated list of attributes to return
+      - stream: 1 to send the array as a chunked response
+    Without limit nor after, every user is returned, as before paging
+    existed.
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented
+      - X-Next-Cursor header when more users may follow
+      - 400 if limit or after is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    fields = request.args.get('fields')
+    stream = request.args.get('stream') in ('1', 'true')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+    if fields is not None:
+        fields = [f for f in fields.split(',') if f]
+
+    if stream:
+        try:
+            start = 0 if after is None else User.position(after) + 1
+        except KeyError:
+            return jsonify({'error': "invalid cursor"}), 400
+        user_ids = None
+        if limit is not None:
+            user_ids, _ = User.ids_from(start, limit)
+        resp = Response(stream_with_context(
+            _stream_users(start, user_ids, fields)),
+            mimetype='application/json')
+        if user_ids is not None and len(user_ids) == limit:
+            resp.headers['X-Next-Cursor'] = user_ids[-1]
+        return resp
+    if limit is None and after is None:
+        users = User.all()
+    else:
+        try:
+            users = User.page(after, limit)
+        except KeyError:
+            return jsonify({'error': "invalid cursor"}), 400
+    resp = jsonify([_project(user, fields) for user in users])
+    if limit is not None and len(users) == limit:
+        resp.headers['X-Next-Cursor'] = users[-1].id
+    return resp
 
 
 @app_views.route('/users/me', methods=['GET'], strict_slashes=False)
@@ -39,8 +128,10 @@ def view_one_user(user_id: str = None) -> str:
     """
     if user_id is None:
         abort(404)
-    if user_id == me and request.current_user() is None:
-        abort(404)
+    if user_id == 'me':
+        if request.current_user is None:
+            abort(404)
+        return jsonify(request.current_user.to_json())
     user = User.get(user_id)
     if user is None:
         abort(404)
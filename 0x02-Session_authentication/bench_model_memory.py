@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+""" Memory benchmark of User objects, with and without __slots__
+
+Builds the same users twice, as slotted User objects and as objects
+with the __dict__ layout Base had before slots, and reports the bytes
+per user traced by tracemalloc: the object, its __dict__ if any and the
+datetimes parsed for it. Its strings come from the loaded records and
+are shared, so they are left out.
+
+Usage:
+    ./bench_model_memory.py [--count N]
+"""
+import argparse
+import sys
+import tracemalloc
+import uuid
+from typing import Callable, List
+
+from models.base import parse_timestamp
+from models.user import User
+
+
+class DictUser():
+    """ The attributes of a User in a per-instance __dict__, as before
+    slots
+    """
+
+    def __init__(self, **kwargs: dict):
+        """ Initialize like Base and User do
+        """
+        self.id = kwargs.get('id')
+        self.created_at = parse_timestamp(kwargs.get('created_at'))
+        self.updated_at = parse_timestamp(kwargs.get('updated_at'))
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+def make_records(count: int) -> List[dict]:
+    """
+    Returns `count` user records as read from a snapshot file
+    """
+    return [{
+        'id': str(uuid.uuid4()),
+        'created_at': "2017-09-25T01:55:17",
+        'updated_at': "2017-09-25T01:55:17",
+        'email': "user{}@example.com".format(i),
+        '_password': "pbkdf2_sha256$260000$" + "s" * 24 + "$" + "h" * 44,
+        'first_name': "First{}".format(i),
+        'last_name': "Last{}".format(i),
+    } for i in range(count)]
+
+
+def bytes_per_object(factory: Callable, records: List[dict]) -> float:
+    """
+    Returns the memory traced while building one object per record,
+    divided by the number of records
+    """
+    # Copies made outside the trace: only the objects are counted
+    records = [dict(record) for record in records]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [factory(**record) for record in records]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return (after - before) / len(records)
+
+
+def main() -> int:
+    """
+    Runs the benchmark and prints the bytes per user of both layouts
+
+    Returns:
+        int: the process exit status
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000,
+                        help="users built per layout (default: 100000)")
+    args = parser.parse_args()
+
+    records = make_records(args.count)
+    with_dict = bytes_per_object(DictUser, records)
+    with_slots = bytes_per_object(User, records)
+    print("{:<22} {:>10}".format("layout", "bytes/user"))
+    print("{:<22} {:>10.0f}".format("__dict__ (before)", with_dict))
+    print("{:<22} {:>10.0f}".format("__slots__ (User)", with_slots))
+    print("saved {:.0f} bytes per user ({:.0%})".format(
+        with_dict - with_slots, 1 - with_slots / with_dict))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
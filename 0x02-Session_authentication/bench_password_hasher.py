@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+""" Benchmark of password verification for every hasher and cost
+
+Reports how many verifications per second each hasher sustains on one
+core, which is what PASSWORD_HASH_COST trades against login latency and
+brute force resistance.
+
+Usage:
+    ./bench_password_hasher.py [--quick] [--min-time SECONDS]
+"""
+import argparse
+import sys
+from time import perf_counter
+from typing import List, Tuple
+
+from models.password_hasher import (LegacySHA256Hasher, PasswordHasher,
+                                    PBKDF2Hasher, ScryptHasher)
+
+PASSWORD = "correct horse battery staple"
+
+
+def make_hashers(quick: bool) -> List[Tuple[str, PasswordHasher]]:
+    """
+    Returns the hashers to measure, labelled by algorithm and cost
+    """
+    pbkdf2_costs = (10000, 100000) if quick else \
+        (10000, 100000, 260000, 600000)
+    scrypt_costs = (14,) if quick else (14, 15, 16, 17)
+    hashers = [("pbkdf2_sha256 {}".format(cost), PBKDF2Hasher(cost))
+               for cost in pbkdf2_costs]
+    hashers += [("scrypt N=2^{}".format(cost), ScryptHasher(cost))
+                for cost in scrypt_costs]
+    hashers.append(("sha256 (legacy)", LegacySHA256Hasher(0)))
+    return hashers
+
+
+def measure(hasher: PasswordHasher, min_time: float) -> float:
+    """
+    Returns the verifications per second of a hasher, timing batches
+    until `min_time` seconds have been spent
+    """
+    encoded = hasher.encode(PASSWORD)
+    verify = hasher.verify
+    count = 0
+    batch = 1
+    start = perf_counter()
+    while True:
+        for _ in range(batch):
+            if not verify(PASSWORD, encoded):
+                raise AssertionError("verification failed")
+        count += batch
+        elapsed = perf_counter() - start
+        if elapsed >= min_time:
+            return count / elapsed
+        batch *= 2
+
+
+def main() -> int:
+    """
+    Runs the benchmark and prints a table
+
+    Returns:
+        int: the process exit status
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true",
+                        help="fewer costs and shorter runs")
+    parser.add_argument("--min-time", type=float, default=None,
+                        help="seconds spent per hasher (default: 2, "
+                             "0.5 with --quick)")
+    args = parser.parse_args()
+    min_time = args.min_time
+    if min_time is None:
+        min_time = 0.5 if args.quick else 2.0
+
+    print("{:<22} {:>14} {:>12}".format("hasher", "verify/s", "ms/verify"))
+    for label, hasher in make_hashers(args.quick):
+        rate = measure(hasher, min_time)
+        print("{:<22} {:>14.1f} {:>12.3f}".format(label, rate, 1e3 / rate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
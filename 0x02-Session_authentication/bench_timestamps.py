@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+""" Microbenchmark of model timestamp parsing and formatting
+
+Times parse_timestamp and format_timestamp against strptime and strftime
+with TIMESTAMP_FORMAT over the same timestamps, and checks that both
+give identical results.
+
+Usage:
+    ./bench_timestamps.py [--count N]
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Callable, List
+
+from models.base import TIMESTAMP_FORMAT, format_timestamp, parse_timestamp
+
+
+def make_timestamps(count: int, seed: int = 0) -> List[datetime]:
+    """
+    Returns `count` naive datetimes with whole seconds, spread over about
+    30 years
+    """
+    rng = random.Random(seed)
+    origin = datetime(2000, 1, 1)
+    return [origin + timedelta(seconds=rng.randrange(30 * 365 * 86400))
+            for _ in range(count)]
+
+
+def timed(func: Callable, values: list) -> tuple:
+    """
+    Returns the results of `func` over `values` and the seconds it took
+    """
+    start = perf_counter()
+    results = [func(value) for value in values]
+    return results, perf_counter() - start
+
+
+def main() -> int:
+    """
+    Runs the benchmark and prints a table
+
+    Returns:
+        int: the process exit status, 1 if the results differ
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000000,
+                        help="timestamps per run (default: 1000000)")
+    args = parser.parse_args()
+
+    values = make_timestamps(args.count)
+    strings, strftime_s = timed(
+        lambda value: value.strftime(TIMESTAMP_FORMAT), values)
+    formatted, format_s = timed(format_timestamp, values)
+    parsed_slow, strptime_s = timed(
+        lambda value: datetime.strptime(value, TIMESTAMP_FORMAT), strings)
+    parsed, parse_s = timed(parse_timestamp, strings)
+
+    print("{:<10} {:>12} {:>12} {:>8}".format(
+        "operation", "baseline s", "fast path s", "speedup"))
+    print("{:<10} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+        "parse", strptime_s, parse_s, strptime_s / parse_s))
+    print("{:<10} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+        "format", strftime_s, format_s, strftime_s / format_s))
+    if parsed != parsed_slow or formatted != strings:
+        print("MISMATCH between the fast path and the baseline",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,161 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from bisect import bisect_left
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Tuple
+import atexit
+from os import (O_CREAT, O_RDONLY, O_RDWR, close, fdopen, fstat, fsync,
+                getenv, link, path, remove, rename, replace, stat)
+from os import open as os_open
+from shutil import copyfile, copyfileobj
+from tempfile import mkstemp
+from time import perf_counter
+import fcntl
+import hashlib
+from threading import Event, RLock, Thread
 import json
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+CHECKSUM_PREFIX = "#sha256:"
+SNAPSHOT_HEADER = b"#format:ndjson"
 DATA = {}
+INDEXES = {}
+POSITIONS = {}
+LOCKS = {}
+FLUSH_LOCKS = {}
+DIRTY = {}
+LOAD_STATS = {}
+_UNSET = object()
+_flush_requested = Event()
+_flusher = None
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string
+
+    datetime.fromisoformat is a C fast path for this ISO 8601 layout. It
+    also accepts other ISO forms TIMESTAMP_FORMAT rejects (dates alone,
+    UTC offsets giving aware datetimes...), so it is only used when the
+    string has the exact shape of TIMESTAMP_FORMAT; anything else goes
+    through strptime.
+    """
+    if len(value) == 19 and value[4] == value[7] == '-' and \
+            value[10] == 'T' and value[13] == value[16] == ':':
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            pass
+        else:
+            if parsed.tzinfo is None:
+                return parsed
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    """ Format a datetime with TIMESTAMP_FORMAT
+
+    isoformat matches TIMESTAMP_FORMAT for naive datetimes with a four
+    digit year and is much cheaper than strftime.
+    """
+    if value.tzinfo is None and value.year >= 1000:
+        return value.isoformat(timespec='seconds')
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+class _Positions():
+    """ Insertion order of the objects of a class, for cursor paging
+
+    Every object gets an increasing sequence number when it is first
+    stored. The sorted list of live sequence numbers lets a cursor ID be
+    resolved with a bisect instead of a scan of DATA. Removed objects
+    keep their number in `seq`, so their ID still works as a cursor,
+    until the index is rebuilt by the next load.
+    """
+    __slots__ = ('seq', 'ids', 'order', 'next')
+
+    def __init__(self):
+        """ Initialize an empty index
+        """
+        self.seq = {}
+        self.ids = {}
+        self.order = []
+        self.next = 0
+
+    def add(self, obj_id: str):
+        """ Give an object the next position, unless it has a live one
+        already: an object stored again after its removal goes last, as
+        in DATA
+        """
+        if self.seq.get(obj_id) in self.ids:
+            return
+        self.seq[obj_id] = self.next
+        self.ids[self.next] = obj_id
+        self.order.append(self.next)
+        self.next += 1
+
+    def remove(self, obj_id: str):
+        """ Take an object out of the order, keeping its position
+        """
+        n = self.seq.get(obj_id)
+        if n is None or self.ids.get(n) != obj_id:
+            return
+        del self.ids[n]
+        del self.order[bisect_left(self.order, n)]
 
 
 class Base():
     """ Base class
     """
+    # Instance attributes live in slots: no per-instance __dict__
+    __slots__ = ('id', 'created_at', 'updated_at')
+    # Attributes kept in a secondary index so `search` on them is O(1)
+    indexed_attributes = ()
+    # Indexed attributes no two objects may share (None excepted)
+    unique_attributes = ()
+    # 'snapshot' rewrites the whole file on every write, 'journal' appends
+    # and 'write_behind' leaves the file write to a background flusher
+    persistence = getenv('DB_PERSISTENCE', 'snapshot')
+    journal_compact_threshold = int(getenv('DB_JOURNAL_COMPACT_THRESHOLD',
+                                           1000))
+    flush_interval = float(getenv('DB_FLUSH_INTERVAL', 1.0))
+    flush_threshold = int(getenv('DB_FLUSH_THRESHOLD', 1000))
+    # Keep loaded records raw until get() / search() first returns them
+    lazy_load = getenv('DB_LAZY_LOAD', '0') == '1'
+    snapshot_generations = int(getenv('DB_SNAPSHOT_GENERATIONS', 0))
+    snapshot_fsync_dir = getenv('DB_FSYNC_DIR', '0') == '1'
+    # Lock file of classes whose files several processes write: held
+    # around their writes and compactions (None: one process only)
+    lock_path = None
+    _journal_size = 0
+    _compacting = False
+    _dirty_count = 0
+    # What the last load read: snapshot (inode, size, mtime), journal
+    # inode and the offset up to which the journal was applied
+    _loaded_snapshot = _UNSET
+    _loaded_journal = None
+    _journal_offset = 0
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        if DATA.get(s_class) is None or INDEXES.get(s_class) is None:
+            with self.__class__._lock():
+                DATA.setdefault(s_class, {})
+                if INDEXES.get(s_class) is None:
+                    self.__class__._reset_indexes()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -48,58 +172,498 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key in self.__class__._field_names():
+            value = getattr(self, key, _UNSET)
+            if value is _UNSET:
+                continue
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+                result[key] = format_timestamp(value)
             else:
                 result[key] = value
+        if hasattr(self, '__dict__'):
+            for key, value in self.__dict__.items():
+                if not for_serialization and key[0] == '_':
+                    continue
+                if type(value) is datetime:
+                    result[key] = format_timestamp(value)
+                else:
+                    result[key] = value
         return result
 
+    @classmethod
+    def _field_names(cls) -> tuple:
+        """ Return the slot attributes of the class, base classes first
+        """
+        names = cls.__dict__.get('_slot_names')
+        if names is None:
+            names = tuple(
+                name
+                for klass in reversed(cls.__mro__)
+                for name in klass.__dict__.get('__slots__', ())
+            )
+            cls._slot_names = names
+        return names
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal on top
+
+        The flush lock keeps a compaction from swapping the files while
+        they are read.
+        """
+        with FLUSH_LOCKS.setdefault(cls.__name__, RLock()):
+            cls.flush()
+            with cls._lock():
+                cls._load_from_file()
+
+    @classmethod
+    def _load_from_file(cls):
+        """ Rebuild DATA and the indexes of the class from its files
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        cls._reset_indexes()
+        cls._journal_size = 0
+        # Taken before reading: a rewrite during the load shows as a change
+        cls._loaded_snapshot = _file_signature(file_path)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        # Fall back to the newest previous generation that verifies
+        generations = [file_path] + [
+            "{}.{}".format(file_path, n)
+            for n in range(1, cls.snapshot_generations + 1)
+        ]
+        error = None
+        start = perf_counter()
+        for snapshot_path in generations:
+            try:
+                for raw, obj_json in cls._read_snapshot(snapshot_path):
+                    if cls.lazy_load:
+                        # Materialized on first access by get() / search()
+                        obj = raw if raw is not None else obj_json
+                        DATA[s_class][obj_json.get('id')] = obj
+                        cls._index_add(obj_json)
+                        continue
+                    obj = cls(**obj_json)
+                    DATA[s_class][obj.id] = obj
+                    cls._index_add(obj)
+            except FileNotFoundError:
+                continue
+            except ValueError as e:
+                error = error or e
+                DATA[s_class] = {}
+                cls._reset_indexes()
+                continue
+            break
+        else:
+            snapshot_path = None
+            if error is not None:
+                # Never start empty on top of a corrupted snapshot
+                raise error
+        LOAD_STATS[s_class] = {
+            'source': snapshot_path,
+            'objects': len(DATA[s_class]),
+            'seconds': perf_counter() - start,
+        }
+
+        journal_path = ".db_{}.journal".format(s_class)
+        cls._loaded_journal = None
+        cls._journal_offset = 0
+        for replay_path in (journal_path + ".compacting", journal_path):
+            # Another process may compact: a file can go at any time
+            try:
+                f = open(replay_path, 'rb+')
+            except FileNotFoundError:
+                continue
+            with f:
+                offset = cls._replay_journal(f)
+                if replay_path == journal_path:
+                    cls._journal_offset = offset
+                    cls._loaded_journal = fstat(f.fileno()).st_ino
+
+    @classmethod
+    def refresh_from_journal(cls) -> bool:
+        """ Apply the journal records appended, by any process, since the
+        last load or refresh
+
+        Returns False, without changing anything, when the files changed
+        in another way (snapshot rewritten, journal compacted): only
+        load_from_file can then bring the class up to date.
+        """
+        journal_path = ".db_{}.journal".format(cls.__name__)
+        with FLUSH_LOCKS.setdefault(cls.__name__, RLock()):
+            with cls._lock():
+                file_path = ".db_{}.json".format(cls.__name__)
+                if _file_signature(file_path) != cls._loaded_snapshot:
+                    return False
+                try:
+                    f = open(journal_path, 'rb+')
+                except FileNotFoundError:
+                    return cls._loaded_journal is None
+                with f:
+                    # Checked on the open file: it can't be swapped anymore
+                    st = fstat(f.fileno())
+                    if cls._loaded_journal not in (None, st.st_ino) or \
+                            st.st_size < cls._journal_offset:
+                        return False
+                    if st.st_size > cls._journal_offset:
+                        # A record being appended now is left for later
+                        cls._journal_offset = cls._replay_journal(
+                            f, cls._journal_offset, truncate=False)
+                    cls._loaded_journal = st.st_ino
+                return True
+
+    @classmethod
+    def _replay_journal(cls, f, start: int = 0, truncate: bool = True) -> int:
+        """ Apply every complete record of a journal file, opened in 'rb+'
+        mode, to DATA, from byte `start` on, and return the offset
+        following the last one
+
+        A torn record left by a crash mid-append can only be the last
+        one: unless `truncate` is False, it is cut off so later appends
+        start on a clean line.
+        """
+        s_class = cls.__name__
+        offset = start
+        f.seek(start)
+        for line in f:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete record")
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                if truncate:
+                    f.truncate(offset)
+                break
+            offset += len(line)
+            obj_id = record.get('id')
+            cls._index_remove(obj_id)
+            if record.get('op') == 'remove':
+                DATA[s_class].pop(obj_id, None)
+                POSITIONS[s_class].remove(obj_id)
+            else:
+                obj = cls(**record.get('obj'))
+                DATA[s_class][obj_id] = obj
+                cls._index_add(obj)
+            cls._journal_size += 1
+        return offset
+
+    @staticmethod
+    def _read_snapshot(file_path: str) -> Iterator[tuple]:
+        """ Stream the objects of a snapshot file one at a time
+
+        Line-delimited snapshots are parsed record by record and their
+        checksum trailer is verified once the last record is read.
+        Single-document files from earlier versions are still accepted.
+        Yields (raw line or None, parsed dict) pairs.
+        Raises ValueError when the file is truncated or corrupted.
+        """
+        with open(file_path, 'rb') as f:
+            header = f.readline()
+            if header.rstrip(b"\n") != SNAPSHOT_HEADER:
+                content = (header + f.read()).decode('utf-8')
+                yield from Base._read_legacy_snapshot(file_path, content)
+                return
+            digest = hashlib.sha256(header)
+            for line in f:
+                if line.startswith(CHECKSUM_PREFIX.encode('utf-8')):
+                    expected = line[len(CHECKSUM_PREFIX):].strip()
+                    if expected.decode('utf-8') != digest.hexdigest():
+                        raise ValueError(
+                            "checksum mismatch in {}".format(file_path))
+                    return
+                digest.update(line)
+                line = line.rstrip(b"\n")
+                yield line, json.loads(line)
+        raise ValueError("missing checksum trailer in {}".format(file_path))
+
+    @staticmethod
+    def _read_legacy_snapshot(file_path: str,
+                              content: str) -> Iterator[tuple]:
+        """ Read a snapshot written as a single {id: object} JSON document
+        """
+        body, sep, trailer = content.rstrip("\n").rpartition("\n")
+        if sep and trailer.startswith(CHECKSUM_PREFIX):
+            digest = hashlib.sha256(body.encode('utf-8')).hexdigest()
+            if trailer[len(CHECKSUM_PREFIX):] != digest:
+                raise ValueError("checksum mismatch in {}".format(file_path))
+            content = body
+        for obj_json in json.loads(content).values():
+            yield None, obj_json
+
+    @classmethod
+    def _write_snapshot(cls, objs: dict):
+        """ Serialize a {id: object} mapping to the snapshot file
+
+        Objects are streamed one JSON document per line into a temporary
+        file, which is fsynced and renamed over the previous one, so
+        readers never see a partial file.
+        """
+        file_path = ".db_{}.json".format(cls.__name__)
+        dir_path = path.dirname(path.abspath(file_path))
+        fd, tmp_path = mkstemp(prefix=file_path + ".", suffix=".tmp",
+                               dir=dir_path)
+        try:
+            with fdopen(fd, 'wb') as f:
+                line = SNAPSHOT_HEADER + b"\n"
+                digest = hashlib.sha256(line)
+                f.write(line)
+                for obj in objs.values():
+                    if type(obj) is bytes:
+                        # Never materialized: written back untouched
+                        line = obj + b"\n"
+                    else:
+                        if isinstance(obj, Base):
+                            obj = obj.to_json(True)
+                        line = (json.dumps(obj) + "\n").encode()
+                    digest.update(line)
+                    f.write(line)
+                f.write("{}{}\n".format(CHECKSUM_PREFIX,
+                                        digest.hexdigest()).encode())
+                f.flush()
+                fsync(f.fileno())
+            cls._rotate_generations(file_path)
+            replace(tmp_path, file_path)
+        except BaseException:
+            if path.exists(tmp_path):
+                remove(tmp_path)
+            raise
+        if cls.snapshot_fsync_dir:
+            dir_fd = os_open(dir_path, O_RDONLY)
+            try:
+                fsync(dir_fd)
+            finally:
+                close(dir_fd)
+
+    @classmethod
+    def _rotate_generations(cls, file_path: str):
+        """ Keep the last `snapshot_generations` snapshots as .1, .2, ...
+        """
+        count = cls.snapshot_generations
+        if count <= 0 or not path.exists(file_path):
+            return
+        for n in range(count - 1, 0, -1):
+            older = "{}.{}".format(file_path, n)
+            if path.exists(older):
+                replace(older, "{}.{}".format(file_path, n + 1))
+        first = "{}.1".format(file_path)
+        if path.exists(first):
+            remove(first)
+        # A hard link keeps the current snapshot in place until the rename
+        try:
+            link(file_path, first)
+        except OSError:
+            copyfile(file_path, first)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
+        cls._snapshot()
+
+    @classmethod
+    def _snapshot(cls):
+        """ Write a copy-on-write snapshot of the class to its file
+
+        Only the copy of DATA is taken under the data lock, so readers and
+        writers are not blocked while it is serialized. Any journal is set
+        aside at the same instant and deleted once the snapshot, which
+        contains its records, is in place. The flush lock keeps snapshots
+        of the class landing in the order they were taken.
+        """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        journal_path = ".db_{}.journal".format(s_class)
+        compacting_path = journal_path + ".compacting"
+        with FLUSH_LOCKS.setdefault(s_class, RLock()):
+            with cls._lock():
+                if path.exists(compacting_path):
+                    # Leftover of an interrupted compaction: keep its records
+                    try:
+                        with open(journal_path, 'rb') as src, \
+                                open(compacting_path, 'ab') as dst:
+                            copyfileobj(src, dst)
+                        remove(journal_path)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    try:
+                        rename(journal_path, compacting_path)
+                    except FileNotFoundError:
+                        pass
+                objs = dict(DATA[s_class])
+                cls._journal_size = 0
+                dirty = DIRTY.pop(s_class, None)
+                cls._dirty_count = 0
+            try:
+                cls._write_snapshot(objs)
+            except BaseException:
+                if dirty is not None:
+                    DIRTY[s_class] = dirty
+                raise
+            try:
+                remove(compacting_path)
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def _append_journal(cls, record: dict):
+        """ Append one record to the journal and compact it when it grows
+        """
+        journal_path = ".db_{}.journal".format(cls.__name__)
+        line = (json.dumps(record) + "\n").encode()
+        with cls._lock():
+            with open(journal_path, 'ab') as f:
+                f.write(line)
+                end = f.tell()
+                if cls._journal_offset == end - len(line):
+                    # Nothing appended by others since: no need to replay
+                    # our own record on the next refresh
+                    cls._journal_offset = end
+                    cls._loaded_journal = fstat(f.fileno()).st_ino
+            cls._journal_size += 1
+            compact = (cls._journal_size >= cls.journal_compact_threshold and
+                       not cls._compacting)
+            if compact:
+                cls._compacting = True
+        if compact:
+            Thread(target=cls.compact, daemon=True).start()
+
+    @classmethod
+    def compact(cls):
+        """ Fold the journal into a fresh snapshot file
+
+        Writers keep appending to a new journal while the snapshot is
+        serialized. When other processes share the files, the journal
+        holds their records too: they are read back first, under the
+        lock file, so the snapshot doesn't drop them.
+        """
+        try:
+            with cls.file_lock():
+                if cls.lock_path is not None and \
+                        not cls.refresh_from_journal():
+                    cls.load_from_file()
+                cls._snapshot()
+        finally:
+            cls._compacting = False
+
+    @classmethod
+    @contextmanager
+    def file_lock(cls):
+        """ Exclusive lock on `lock_path`, held across processes
+
+        Does nothing for a class without a lock file. Not reentrant: two
+        holders in the same process block each other.
+        """
+        if cls.lock_path is None:
+            yield
+            return
+        fd = os_open(cls.lock_path, O_RDWR | O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            close(fd)
+
+    @classmethod
+    def _mark_dirty(cls):
+        """ Record a pending write for the background flusher
+        """
+        global _flusher
+        with cls._lock():
+            DIRTY[cls.__name__] = cls
+            cls._dirty_count += 1
+            if cls._dirty_count >= cls.flush_threshold:
+                _flush_requested.set()
+            if _flusher is None:
+                _flusher = Thread(target=_flush_loop, daemon=True)
+                _flusher.start()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def flush(cls):
+        """ Write pending changes of the class to its snapshot file
+        """
+        if cls.__name__ in DIRTY:
+            cls._snapshot()
+
+    @classmethod
+    def _lock(cls) -> RLock:
+        """ Return the lock guarding DATA, indexes and journal of the class
+        """
+        return LOCKS.setdefault(cls.__name__, RLock())
 
     def save(self):
         """ Save current object
+
+        Raises ValueError if the value of one of `unique_attributes` is
+        new or changed, and already used by another object.
         """
-        s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        cls = self.__class__
+        with cls._lock():
+            cls._check_unique(self)
+            self.updated_at = datetime.utcnow()
+            DATA[cls.__name__][self.id] = self
+            cls._index_remove(self.id)
+            cls._index_add(self)
+            if cls.persistence == 'journal':
+                # Appended under the lock: journal order is mutation order
+                cls._append_journal({
+                    'op': 'save', 'id': self.id, 'obj': self.to_json(True)
+                })
+                return
+        cls._persist()
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        cls = self.__class__
+        with cls._lock():
+            if DATA[cls.__name__].pop(self.id, None) is None:
+                return
+            cls._index_remove(self.id)
+            POSITIONS[cls.__name__].remove(self.id)
+            if cls.persistence == 'journal':
+                cls._append_journal({'op': 'remove', 'id': self.id})
+                return
+        cls._persist()
+
+    @classmethod
+    def _check_unique(cls, obj):
+        """ Raise ValueError if another object holds a unique value of
+        `obj` that `obj` didn't have when it was last stored
+
+        Duplicates loaded from files written before the constraint can
+        still be saved, as long as the duplicated value is left alone.
+        """
+        indexes = INDEXES[cls.__name__]
+        stored = indexes['__values__'].get(obj.id)
+        for attr in cls.unique_attributes:
+            value = getattr(obj, attr, None)
+            if value is None:
+                continue
+            if stored is not None and \
+                    stored[cls.indexed_attributes.index(attr)] == value:
+                continue
+            try:
+                owners = indexes[attr].get(value, ())
+            except TypeError:
+                continue
+            if any(obj_id != obj.id for obj_id in owners):
+                raise ValueError("{} {!r} is already used".format(
+                    attr, value))
+
+    @classmethod
+    def _persist(cls):
+        """ Make the last change durable according to `persistence`
+
+        Never called with the data lock held: a snapshot takes the flush
+        lock first.
+        """
+        if cls.persistence == 'write_behind':
+            cls._mark_dirty()
+        else:
+            cls._snapshot()
 
     @classmethod
     def count(cls) -> int:
@@ -114,18 +678,152 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def ids(cls) -> List[str]:
+        """ Return the IDs of all objects, in insertion order
+        """
+        with cls._lock():
+            return list(DATA[cls.__name__].keys())
+
+    @classmethod
+    def position(cls, obj_id: str) -> int:
+        """ Return the position of an object in insertion order
+
+        Positions only grow and are never reused, so they stay valid
+        cursors after the object is removed, until the class is loaded
+        from its files again.
+        Raises KeyError if `obj_id` wasn't stored since the last load.
+        """
+        with cls._lock():
+            return POSITIONS[cls.__name__].seq[obj_id]
+
+    @classmethod
+    def ids_from(cls, position: int = 0,
+                 limit: int = None) -> Tuple[List[str], int]:
+        """ Return up to `limit` IDs in insertion order, starting at
+        `position`, and the position following the last one returned
+
+        Costs O(log N + limit) whatever the number of objects.
+        """
+        with cls._lock():
+            positions = POSITIONS[cls.__name__]
+            start = bisect_left(positions.order, position)
+            end = None if limit is None else start + limit
+            seqs = positions.order[start:end]
+            if not seqs:
+                return [], position
+            return [positions.ids[n] for n in seqs], seqs[-1] + 1
+
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects in insertion order, starting
+        right after the object with ID `after`
+
+        Raises KeyError if `after` wasn't stored since the last load.
+        """
+        with cls._lock():
+            start = 0 if after is None else cls.position(after) + 1
+            obj_ids, _ = cls.ids_from(start, limit)
+            return [cls.get(obj_id) for obj_id in obj_ids]
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        obj = DATA[s_class].get(id)
+        if obj is None or isinstance(obj, Base):
+            return obj
+        return cls._materialize(id, obj)
+
+    @classmethod
+    def _materialize(cls, obj_id: str, record) -> TypeVar('Base'):
+        """ Build the object of a record kept raw by a lazy load
+        """
+        with cls._lock():
+            # Another thread may have materialized it in the meantime
+            current = DATA[cls.__name__].get(obj_id)
+            if current is not record:
+                return current
+            if type(record) is bytes:
+                record = json.loads(record)
+            obj = cls(**record)
+            DATA[cls.__name__][obj_id] = obj
+            return obj
+
+    @classmethod
+    def _reset_indexes(cls):
+        """ Drop and recreate the (empty) secondary and position indexes
+        of the class
+        """
+        INDEXES[cls.__name__] = {
+            '__values__': {},
+            **{attr: {} for attr in cls.indexed_attributes}
+        }
+        POSITIONS[cls.__name__] = _Positions()
+
+    @classmethod
+    def _index_add(cls, obj):
+        """ Register an object, or the dict of a raw record, in every
+        secondary index of its class
+        """
+        indexes = INDEXES[cls.__name__]
+        if type(obj) is dict:
+            obj_id = obj.get('id')
+            values = [obj.get(attr) for attr in cls.indexed_attributes]
+        else:
+            obj_id = obj.id
+            values = [getattr(obj, attr, None)
+                      for attr in cls.indexed_attributes]
+        for i, attr in enumerate(cls.indexed_attributes):
+            try:
+                indexes[attr].setdefault(values[i], {})[obj_id] = None
+            except TypeError:
+                # Unhashable values are only reachable through a scan
+                values[i] = None
+        indexes['__values__'][obj_id] = tuple(values)
+        POSITIONS[cls.__name__].add(obj_id)
+
+    @classmethod
+    def _index_remove(cls, obj_id: str):
+        """ Unregister an object ID from every secondary index of its class
+        """
+        indexes = INDEXES[cls.__name__]
+        values = indexes['__values__'].pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in zip(cls.indexed_attributes, values):
+            ids = indexes[attr].get(value)
+            if ids is None:
+                continue
+            ids.pop(obj_id, None)
+            if not ids:
+                del indexes[attr][value]
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
         s_class = cls.__name__
+        with cls._lock():
+            ids = DATA[s_class].keys()
+            for attr in cls.indexed_attributes:
+                if attr not in attributes:
+                    continue
+                try:
+                    ids = INDEXES[s_class][attr].get(attributes[attr], {})
+                except TypeError:
+                    pass
+                break
+            records = [(obj_id, DATA[s_class][obj_id]) for obj_id in ids]
+        objs = []
+        for obj_id, obj in records:
+            if not isinstance(obj, Base):
+                obj = cls._materialize(obj_id, obj)
+            if obj is not None:
+                objs.append(obj)
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +831,39 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        return list(filter(_search, objs))
+
+
+def _file_signature(file_path: str):
+    """ (inode, size, modification time) of a file, None if missing
+    """
+    try:
+        st = stat(file_path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def flush_all():
+    """ Flush every class with pending write-behind changes
+    """
+    for cls in list(DIRTY.values()):
+        cls.flush()
+
+
+def _flush_loop():
+    """ Background flusher: wake up on the interval or when a class
+    crosses its dirty threshold, then flush everything pending
+    """
+    while True:
+        _flush_requested.wait(Base.flush_interval)
+        _flush_requested.clear()
+        try:
+            flush_all()
+        except Exception:
+            # Classes stay dirty and are retried on the next wake-up
+            pass
+
+
+atexit.register(flush_all)
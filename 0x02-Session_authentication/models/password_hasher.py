@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+""" Password hasher module
+"""
+from abc import ABC, abstractmethod
+from os import getenv, urandom
+import base64
+import hashlib
+import hmac
+
+
+class PasswordHasher(ABC):
+    """ Base class of the password hashers
+
+    Encoded hashes are versioned: `<algorithm>$<cost>$<salt>$<hash>`, so
+    hashes made with another algorithm or cost can still be verified and
+    are flagged for an upgrade.
+    """
+    algorithm = None
+
+    def __init__(self, cost: int):
+        """ Initialize a hasher with its work factor
+        """
+        self.cost = cost
+
+    @abstractmethod
+    def _derive(self, pwd: bytes, salt: bytes, cost: int) -> bytes:
+        """ Derive the raw hash of a password
+        """
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password with a fresh salt
+        """
+        salt = urandom(16)
+        digest = self._derive(pwd.encode(), salt, self.cost)
+        return "{}${}${}${}".format(self.algorithm, self.cost,
+                                    _b64(salt), _b64(digest))
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against an encoded hash
+        """
+        try:
+            algorithm, cost, salt, digest = encoded.split('$')
+            cost = int(cost)
+            salt = base64.b64decode(salt)
+        except ValueError:
+            return False
+        if algorithm != self.algorithm:
+            return False
+        try:
+            expected = _b64(self._derive(pwd.encode(), salt, cost))
+        except (ValueError, OverflowError):
+            # A cost the KDF rejects can't have produced this hash
+            return False
+        return hmac.compare_digest(expected, digest)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """ Check if an encoded hash was made with other settings
+        """
+        prefix = "{}${}$".format(self.algorithm, self.cost)
+        return not encoded.startswith(prefix)
+
+
+class PBKDF2Hasher(PasswordHasher):
+    """ PBKDF2-HMAC-SHA256, the cost is the number of iterations
+    """
+    algorithm = 'pbkdf2_sha256'
+
+    def _derive(self, pwd: bytes, salt: bytes, cost: int) -> bytes:
+        """ Derive the raw hash of a password
+        """
+        return hashlib.pbkdf2_hmac('sha256', pwd, salt, cost)
+
+
+class ScryptHasher(PasswordHasher):
+    """ scrypt with r=8 and p=1, the cost is log2 of the N parameter
+    """
+    algorithm = 'scrypt'
+
+    def _derive(self, pwd: bytes, salt: bytes, cost: int) -> bytes:
+        """ Derive the raw hash of a password
+        """
+        n = 2 ** cost
+        # scrypt needs 128 * r * N bytes, plus headroom; OpenSSL rejects
+        # a maxmem above 2 GiB, hence MAX_COSTS
+        return hashlib.scrypt(pwd, salt=salt, n=n, r=8, p=1,
+                              maxmem=128 * 8 * n + 2 ** 20)
+
+
+class LegacySHA256Hasher(PasswordHasher):
+    """ Unsalted SHA256 hex digests stored before hashers were versioned
+
+    Only used to verify existing hashes, which always need a rehash.
+    """
+    algorithm = 'sha256'
+
+    def _derive(self, pwd: bytes, salt: bytes, cost: int) -> bytes:
+        """ SHA256 of the password, without salt nor cost
+        """
+        return hashlib.sha256(pwd).digest()
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password the legacy way
+        """
+        return self._derive(pwd.encode(), b'', 0).hex()
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against a legacy hash
+        """
+        return hmac.compare_digest(self.encode(pwd), encoded)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """ Legacy hashes are always upgraded
+        """
+        return True
+
+
+HASHERS = {
+    PBKDF2Hasher.algorithm: PBKDF2Hasher,
+    ScryptHasher.algorithm: ScryptHasher,
+}
+DEFAULT_COSTS = {
+    PBKDF2Hasher.algorithm: 260000,
+    ScryptHasher.algorithm: 14,
+}
+MIN_COSTS = {
+    PBKDF2Hasher.algorithm: 1000,
+    ScryptHasher.algorithm: 10,
+}
+MAX_COSTS = {
+    PBKDF2Hasher.algorithm: 10 ** 8,
+    ScryptHasher.algorithm: 20,
+}
+_hashers = {}
+
+
+def get_hasher(algorithm: str = None) -> PasswordHasher:
+    """ Return the hasher of an algorithm, by default the configured one
+
+    PASSWORD_HASHER selects the algorithm used for new hashes and
+    PASSWORD_HASH_COST its work factor. Raises ValueError for an unknown
+    algorithm or a cost outside MIN_COSTS..MAX_COSTS.
+    """
+    if algorithm is None:
+        algorithm = getenv('PASSWORD_HASHER', PBKDF2Hasher.algorithm)
+        cost = getenv('PASSWORD_HASH_COST')
+    else:
+        cost = None
+    if algorithm == LegacySHA256Hasher.algorithm:
+        return LegacySHA256Hasher(0)
+    if algorithm not in HASHERS:
+        raise ValueError("Unknown password hasher: {}".format(algorithm))
+    cost = int(cost) if cost else DEFAULT_COSTS[algorithm]
+    if not MIN_COSTS[algorithm] <= cost <= MAX_COSTS[algorithm]:
+        raise ValueError("{} cost must be between {} and {}".format(
+            algorithm, MIN_COSTS[algorithm], MAX_COSTS[algorithm]))
+    key = "{}${}".format(algorithm, cost)
+    if key not in _hashers:
+        _hashers[key] = HASHERS[algorithm](cost)
+    return _hashers[key]
+
+
+def identify_hasher(encoded: str) -> PasswordHasher:
+    """ Return the hasher able to verify an encoded hash
+    """
+    if '$' not in encoded:
+        return get_hasher(LegacySHA256Hasher.algorithm)
+    return get_hasher(encoded.split('$', 1)[0])
+
+
+def _b64(data: bytes) -> str:
+    """ Base64 without newlines, as stored in encoded hashes
+    """
+    return base64.b64encode(data).decode('ascii')
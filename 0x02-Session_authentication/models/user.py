@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 """ User module
 """
-import hashlib
 from models.base import Base
+from models.password_hasher import get_hasher, identify_hasher
 
 
 class User(Base):
     """ User class
     """
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    indexed_attributes = ('email',)
+    unique_attributes = ('email',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -26,22 +29,36 @@ class User(Base):
 
     @password.setter
     def password(self, pwd: str):
-        """ Setter of a new password: encrypt in SHA256
+        """ Setter of a new password: salted hash from the configured hasher
         """
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = get_hasher().encode(pwd)
 
     def is_valid_password(self, pwd: str) -> bool:
         """ Validate a password
+
+        On success, a hash made with a legacy algorithm or an outdated
+        cost is transparently replaced by one from the configured hasher.
         """
         if pwd is None or type(pwd) is not str:
             return False
         if self.password is None:
             return False
-        pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        try:
+            hasher = identify_hasher(self.password)
+        except ValueError:
+            return False
+        if not hasher.verify(pwd, self.password):
+            return False
+        current = get_hasher()
+        if hasher.algorithm != current.algorithm or \
+                current.needs_rehash(self.password):
+            self.password = pwd
+            if User.get(self.id) is self:
+                self.save()
+        return True
 
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
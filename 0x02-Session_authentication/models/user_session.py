@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+""" UserSession module
+"""
+from models.base import Base
+
+
+class UserSession(Base):
+    """ A session ID of a user, persisted like every other model
+    """
+    __slots__ = ('user_id', 'session_id')
+    indexed_attributes = ('session_id',)
+    # Every worker of SessionDBAuth writes the same files
+    lock_path = ".db_UserSession.lock"
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """ Initialize a UserSession instance
+        """
+        super().__init__(*args, **kwargs)
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
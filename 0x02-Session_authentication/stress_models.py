@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+""" Multi-threaded stress run of the model store
+
+Threads save, search, page through and remove users concurrently, in
+each persistence mode, inside a temporary directory. Afterwards the
+store is checked for consistency: every object is reachable through its
+index and through paging, the indexes hold nothing else, and reloading
+the files gives back the same objects.
+
+Usage:
+    ./stress_models.py [--threads N] [--operations N] [--mode MODE]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import traceback
+from threading import Barrier, Thread
+from time import perf_counter
+from typing import List
+
+from models.base import DATA, INDEXES, POSITIONS, flush_all
+from models.user import User
+
+MODES = ("snapshot", "journal", "write_behind")
+
+
+def worker(n: int, operations: int, barrier: Barrier,
+           errors: List[str]) -> None:
+    """
+    Runs `operations` random operations on users of its own and of the
+    other threads
+
+    Arguments:
+        n (int): the number of the thread, used in the emails it creates
+        operations (int): how many operations to run
+        barrier (Barrier): released once every thread is ready
+        errors (List): where failures are reported
+    """
+    rng = random.Random(n)
+    mine = []
+    barrier.wait()
+    try:
+        for i in range(operations):
+            op = rng.random()
+            if op < 0.4 or not mine:
+                user = User(email="{}-{}@stress".format(n, i))
+                user.save()
+                mine.append(user)
+            elif op < 0.6:
+                user = rng.choice(mine)
+                found = User.search({"email": user.email})
+                if [u.id for u in found] != [user.id]:
+                    errors.append("search {} gave {}".format(
+                        user.email, [u.id for u in found]))
+            elif op < 0.7:
+                user = rng.choice(mine)
+                user.first_name = str(i)
+                user.save()
+            elif op < 0.85:
+                user = mine.pop(rng.randrange(len(mine)))
+                user.remove()
+                if User.get(user.id) is not None:
+                    errors.append("{} still there after remove".format(
+                        user.id))
+            else:
+                ids = User.ids()
+                if ids:
+                    try:
+                        User.page(rng.choice(ids), 20)
+                    except KeyError:
+                        # Removed by another thread in the meantime
+                        pass
+    except Exception:
+        errors.append(traceback.format_exc())
+
+
+def check_store(errors: List[str]) -> None:
+    """
+    Checks that DATA, the indexes, paging and the files agree
+    """
+    users = DATA["User"]
+    emails = {user.email: user_id for user_id, user in users.items()}
+    if len(emails) != len(users):
+        errors.append("duplicate emails")
+    index = INDEXES["User"]["email"]
+    indexed = {email: list(ids) for email, ids in index.items()}
+    if indexed != {email: [user_id] for email, user_id in emails.items()}:
+        errors.append("email index out of sync with DATA")
+    if len(INDEXES["User"]["__values__"]) != len(users):
+        errors.append("index values out of sync with DATA")
+
+    paged = []
+    position = 0
+    while True:
+        ids, position = User.ids_from(position, 100)
+        if not ids:
+            break
+        paged.extend(ids)
+    if paged != list(users) or len(POSITIONS["User"].order) != len(users):
+        errors.append("positions out of sync with DATA")
+
+    expected = {user_id: user.to_json(True)
+                for user_id, user in users.items()}
+    flush_all()
+    User.load_from_file()
+    reloaded = {user_id: User.get(user_id).to_json(True)
+                for user_id in DATA["User"]}
+    if reloaded != expected:
+        errors.append("reloaded files differ from memory: {} vs {} users"
+                      .format(len(reloaded), len(expected)))
+
+
+def run(mode: str, threads: int, operations: int) -> List[str]:
+    """
+    Runs the stress test in one persistence mode
+
+    Returns:
+        List: a description of every failure
+    """
+    User.persistence = mode
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            User.load_from_file()
+            barrier = Barrier(threads)
+            pool = [Thread(target=worker,
+                           args=(n, operations, barrier, errors))
+                    for n in range(threads)]
+            start = perf_counter()
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            elapsed = perf_counter() - start
+            check_store(errors)
+            print("{:<13} {} threads x {} ops: {:.2f}s, {} users, {}".format(
+                mode, threads, operations, elapsed, User.count(),
+                "FAILED" if errors else "ok"))
+        finally:
+            os.chdir(cwd)
+    return errors
+
+
+def main() -> int:
+    """
+    Runs the stress test in the requested persistence modes
+
+    Returns:
+        int: the process exit status, 1 if any check failed
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--operations", type=int, default=200,
+                        help="operations per thread (default: 200)")
+    parser.add_argument("--mode", choices=MODES,
+                        help="only run this persistence mode")
+    args = parser.parse_args()
+
+    failed = False
+    for mode in [args.mode] if args.mode else MODES:
+        errors = run(mode, args.threads, args.operations)
+        for error in errors[:10]:
+            print("ERROR " + error, file=sys.stderr)
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())